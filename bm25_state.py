@@ -0,0 +1,24 @@
+#BM25 encoders as stored in papers.bm25_state: v2 keeps the fitted statistics only (doc freqs, n_docs, avgdl,
+#tokenizer params); older rows kept the raw chunk texts and have to be refitted once
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from pinecone_text.sparse import BM25Encoder
+BM25_STATE_VERSION = 2
+def fit_bm25(texts: List[str]) -> BM25Encoder:
+    bm25 = BM25Encoder()
+    bm25.fit(texts)
+    return bm25
+def bm25_to_state(bm25: BM25Encoder) -> Dict[str, Any]: #fitted statistics only(doc freqs, n_docs, avgdl, tokenizer params), no raw texts
+    state = bm25.get_params()
+    state["version"] = BM25_STATE_VERSION
+    return state
+def is_legacy_bm25_state(state: Optional[Dict[str, Any]]) -> bool:
+    return bool(state) and state.get("version") != BM25_STATE_VERSION and "texts" in state
+def bm25_from_state(state: Dict[str, Any]) -> BM25Encoder:#loads a query-ready encoder from bm25 state saved in supabase
+    if state.get("version") == BM25_STATE_VERSION:
+        params = {k: v for k, v in state.items() if k != "version"}
+        return BM25Encoder().set_params(**params)
+    texts = state.get("texts") or [] #legacy texts-only state, has to be refitted
+    if not texts:
+        raise RuntimeError("bm25_state has no texts.")
+    return fit_bm25(texts)
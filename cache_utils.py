@@ -0,0 +1,190 @@
+#cache building blocks: sqlite-backed DiskCache (embeddings, ADE parses) and an in-process LRU - stdlib only
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+logger = logging.getLogger(__name__)
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split())
+def content_key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+class DiskCache:
+    #key -> bytes store bounded by total value size, least recently used rows are evicted first
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        self._conn.commit()
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500): #sqlite caps the number of bound parameters
+                batch = keys[i: i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})", batch
+                ).fetchall()
+                found.update({k: bytes(v) for k, v in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many([(key, value)])
+    def set_many(self, items: List[Tuple[str, bytes]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                [(k, sqlite3.Binary(v), len(v), now) for k, v in items],
+            )
+            self._evict()
+            self._conn.commit()
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9) #trim a little below the cap so we don't evict on every write
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"DiskCache {self.path}: evicted {evicted} entries.")
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+class LRUCache:
+    #thread-safe in-process LRU with optional per-entry TTL and hit/miss counters
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] >= self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+    def __len__(self) -> int:
+        return len(self._data)
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+class TieredCache:
+    #LRU in front of an optional DiskCache; values go through dumps/loads on their way to and from disk
+    def __init__(self, memory: LRUCache, disk: Optional[DiskCache], dumps, loads):
+        self.memory = memory
+        self.disk = disk
+        self.dumps = dumps
+        self.loads = loads
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        raw = self.disk.get(key)
+        if raw is None:
+            return None
+        value = self.loads(raw)
+        self.memory.set(key, value)
+        return value
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, self.dumps(value))
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
+class ParseCache:
+    #document parses on disk keyed by source and the parser version that produced them. A floating alias such as
+    #"dpt-2-latest" never goes into a key: it stands for the version the parser reported on its last live parse in
+    #this process, and until there has been one lookups are skipped, so a parse from an older model is not served
+    def __init__(self, disk: Optional[DiskCache], model: str):
+        self.disk = disk
+        self.model = model
+        self.alias = model.endswith("latest")
+        self._resolved: Optional[str] = None if self.alias else model
+    def get_or_parse(self, kind: str, ident: str, parse: Callable[[], Tuple[Any, Optional[str]]]) -> Any:
+        #parse returns (value, reported version or None); kind says what ident is, e.g. "url" or "sha256"
+        version = self._resolved
+        if self.disk is not None and version is not None:
+            raw = self.disk.get(content_key(kind, version, ident))
+            if raw is not None:
+                logger.info(f"Parse cache hit ({version}).")
+                return json.loads(raw)
+        value, reported = parse()
+        if self.alias:
+            if reported:
+                self._resolved = reported
+            version = reported
+        if self.disk is not None and version is not None:
+            self.disk.set(content_key(kind, version, ident), json.dumps(value).encode("utf-8"))
+        return value
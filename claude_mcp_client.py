@@ -1,7 +1,10 @@
 #claude choosing tools 
 import os
-import requests
-from typing import Dict, List, Any, Optional
+import json
+from http_client import get_session, timeout
+from llm_clients import llm_slot
+from typing import Dict, List, Any, Iterator, Optional
+from llm_bridge import iter_sse_events
 CLAUDE_API_KEY = os.environ.get("CLAUDE_API_KEY", "")
 CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
 MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "http://localhost:5050")
@@ -74,7 +77,7 @@ class ClaudeMCPClient:
             if role in ("user", "assistant") and isinstance(content, str):
                 out.append({"role": role, "content": content})
         return out
-    def _call_claude(self, message, history=None):
+    def _build_payload(self, message, history=None):
         system_prompt = f"""
 You are a strict state-aware orchestrator for a research assistant app.
 
@@ -100,17 +103,19 @@ Your job is to decide which tool to use:
             "tools": self.tools_free_chat,
             "tool_choice": {"type": "auto"},
         }
-        resp = requests.post(
-            CLAUDE_API_URL,
-            headers=self.headers,
-            json=payload,
-            timeout=self.request_timeout,
-        )
-        resp.raise_for_status()
-        return resp.json()
-    def send_message(self, message: str, conversation_history=None):
-        result = self._call_claude(message, history=conversation_history)
-        
+        return payload
+    def _call_claude(self, message, history=None):
+        payload = self._build_payload(message, history)
+        with llm_slot("anthropic"):
+            resp = get_session().post(
+                CLAUDE_API_URL,
+                headers=self.headers,
+                json=payload,
+                timeout=timeout(self.request_timeout),
+            )
+            resp.raise_for_status()
+            return resp.json()
+    def _mark_tool_use(self, result):
         for block in result.get("content", []):
             if isinstance(block, dict) and block.get("type") == "tool_use":
                 tool_name = block["name"]
@@ -118,4 +123,64 @@ Your job is to decide which tool to use:
                 result["__tool_name"] = tool_name
                 result["__tool_payload"] = tool_input
                 return result
-        return result
\ No newline at end of file
+        return result
+    def send_message(self, message: str, conversation_history=None):
+        result = self._call_claude(message, history=conversation_history)
+        return self._mark_tool_use(result)
+    def stream_message(self, message: str, conversation_history=None) -> "ClaudeStream":
+        #same decision as send_message, but text is yielded while it is generated; the assembled
+        #response (including __tool_name/__tool_payload) is on .result once iteration finishes
+        payload = self._build_payload(message, conversation_history)
+        payload["stream"] = True
+        return ClaudeStream(self, payload)
+class ClaudeStream:
+    def __init__(self, client: ClaudeMCPClient, payload: Dict[str, Any]):
+        self.client = client
+        self.payload = payload
+        self.result: Dict[str, Any] = {}
+    def __iter__(self) -> Iterator[str]:
+        message: Dict[str, Any] = {"content": []}
+        blocks: Dict[int, Dict[str, Any]] = {}
+        partial_json: Dict[int, List[str]] = {}
+        with llm_slot("anthropic"), get_session().post(
+            CLAUDE_API_URL,
+            headers=self.client.headers,
+            json=self.payload,
+            timeout=timeout(self.client.request_timeout),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            for _, data in iter_sse_events(resp):
+                kind = data.get("type")
+                if kind == "message_start":
+                    message.update({k: v for k, v in data.get("message", {}).items() if k != "content"})
+                elif kind == "content_block_start":
+                    idx = data.get("index", len(blocks))
+                    blocks[idx] = dict(data.get("content_block", {}))
+                    if blocks[idx].get("type") == "tool_use":
+                        partial_json[idx] = []
+                elif kind == "content_block_delta":
+                    idx = data.get("index", 0)
+                    delta = data.get("delta", {})
+                    block = blocks.setdefault(idx, {"type": "text", "text": ""})
+                    if delta.get("type") == "text_delta":
+                        text = delta.get("text", "")
+                        block["text"] = block.get("text", "") + text
+                        if text:
+                            yield text
+                    elif delta.get("type") == "input_json_delta":
+                        partial_json.setdefault(idx, []).append(delta.get("partial_json", ""))
+                elif kind == "content_block_stop":
+                    idx = data.get("index", 0)
+                    if idx in partial_json:
+                        raw = "".join(partial_json.pop(idx))
+                        try:
+                            blocks[idx]["input"] = json.loads(raw) if raw else {}
+                        except ValueError:
+                            blocks[idx]["input"] = {}
+                elif kind == "message_delta":
+                    message.update(data.get("delta", {}))
+                elif kind == "error":
+                    raise RuntimeError(data.get("error", {}).get("message", "Claude stream error"))
+        message["content"] = [blocks[i] for i in sorted(blocks)]
+        self.result = self.client._mark_tool_use(message)
\ No newline at end of file
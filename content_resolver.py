@@ -1,6 +1,7 @@
 #semantic scholar results paper url extraction
 from __future__ import annotations
-import os, requests
+import os
+from http_client import get_session, timeout
 from typing import Optional, Dict, Any
 UNPAYWALL_EMAIL = os.getenv("UNPAYWALL_EMAIL") #Here i used my mail
 USE_UNPAYWALL = bool(UNPAYWALL_EMAIL and "@" in UNPAYWALL_EMAIL)
@@ -22,10 +23,10 @@ def resolve_pdf_url_from_s2_item(s2_item: Dict[str, Any]) -> Optional[str]:
         return None
     if USE_UNPAYWALL:
         try:
-            r = requests.get(
+            r = get_session().get(
                 f"https://api.unpaywall.org/v2/{doi}",
                 params={"email": UNPAYWALL_EMAIL}, 
-                timeout=20,
+                timeout=timeout(20),
             )
             if not r.ok:
                 return None
@@ -0,0 +1,129 @@
+#assembles retrieved chunks into the LLM context under a token budget: near-duplicate chunks are dropped and
+#oversized tables are cut down to the rows that match the question
+from __future__ import annotations
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8")) #shingle jaccard above this = same chunk
+MAX_TABLE_ROWS = int(os.getenv("CONTEXT_MAX_TABLE_ROWS", "12"))
+MIN_PARTIAL_TOKENS = 60 #don't bother squeezing in a truncated snippet smaller than this
+_WORD_RE = re.compile(r"\w+")
+_HTML_ROW_RE = re.compile(r"<tr\b.*?</tr>", re.I | re.S)
+_STOPWORDS = {
+    "the", "and", "for", "what", "which", "how", "does", "are", "was", "were", "with", "this",
+    "that", "from", "into", "paper", "about", "is", "of", "in", "on", "a", "an", "to", "do",
+}
+@dataclass
+class Snippet:
+    text: str
+    page: Optional[int] = None
+    type: Optional[str] = None
+    score: float = 0.0
+@dataclass
+class ContextStats:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    dropped_duplicates: int = 0
+    truncated_tables: int = 0
+    dropped_over_budget: int = 0
+    notes: List[str] = field(default_factory=list)
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.input_tokens - self.output_tokens)
+def estimate_tokens(text: str) -> int:
+    #~4 characters per token for English BPE tokenizers, close enough for budgeting
+    return (len(text) + 3) // 4
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+def shingles(text: str, k: int = 5) -> Set[int]:
+    words = _words(text)
+    if len(words) < k:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i: i + k])) for i in range(len(words) - k + 1)}
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+def _query_terms(query: str) -> Set[str]:
+    return {w for w in _words(query) if len(w) > 2 and w not in _STOPWORDS}
+def _pick_rows(rows: List[str], terms: Set[str], keep: int) -> List[int]:
+    scored = [(-len(terms & set(_words(r))), i) for i, r in enumerate(rows)]
+    return sorted(i for _, i in sorted(scored)[:keep])
+def truncate_table(text: str, query: str, max_rows: int = MAX_TABLE_ROWS) -> Tuple[str, bool]:
+    terms = _query_terms(query)
+    html_rows = list(_HTML_ROW_RE.finditer(text))
+    if len(html_rows) > max_rows + 1:
+        header, body = html_rows[0], html_rows[1:]
+        keep = _pick_rows([m.group(0) for m in body], terms, max_rows)
+        omitted = len(body) - len(keep)
+        rows = [header.group(0)] + [body[i].group(0) for i in keep]
+        rows.append(f"<!-- {omitted} rows omitted -->")
+        return text[: html_rows[0].start()] + "".join(rows) + text[html_rows[-1].end():], True
+    lines = text.splitlines()
+    table = [i for i, line in enumerate(lines) if line.strip().startswith("|")]
+    if len(table) > max_rows + 2: #markdown: header + separator + rows
+        header, body = table[:2], table[2:]
+        keep = {body[i] for i in _pick_rows([lines[i] for i in body], terms, max_rows)}
+        last_kept = max(keep | set(header))
+        out = []
+        for i, line in enumerate(lines):
+            if i in body and i not in keep:
+                continue
+            out.append(line)
+            if i == last_kept:
+                out.append(f"| ... {len(body) - len(keep)} rows omitted ... |")
+        return "\n".join(out), True
+    return text, False
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    cut = text[: max(0, tokens - 1) * 4] #one token left for the ellipsis
+    space = cut.rfind(" ")
+    if space > len(cut) * 0.8:
+        cut = cut[:space]
+    return cut.rstrip() + " ..."
+def format_snippet(s: Snippet) -> str:
+    return (
+        f"[Page {s.page} | {s.type}]\n"
+        f"{s.text}\n"
+        f"(Score: {s.score:.3f})\n"
+    )
+def assemble_context(
+    snippets: List[Snippet],
+    query: str,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = DEDUP_THRESHOLD,
+    max_table_rows: int = MAX_TABLE_ROWS,
+) -> Tuple[List[str], ContextStats]:
+    #snippets are expected best-first; returns formatted blocks that fit in the budget plus what was saved
+    stats = ContextStats()
+    kept_shingles: List[Set[int]] = []
+    blocks: List[str] = []
+    used = 0
+    for s in snippets:
+        text = s.text.strip()
+        if not text:
+            continue
+        stats.input_tokens += estimate_tokens(format_snippet(Snippet(text, s.page, s.type, s.score)))
+        sh = shingles(text)
+        if any(jaccard(sh, other) >= dedup_threshold for other in kept_shingles):
+            stats.dropped_duplicates += 1
+            continue
+        text, truncated = truncate_table(text, query, max_table_rows)
+        if truncated:
+            stats.truncated_tables += 1
+        block = format_snippet(Snippet(text, s.page, s.type, s.score))
+        cost = estimate_tokens(block)
+        if used + cost > budget:
+            room = budget - used - estimate_tokens(format_snippet(Snippet("", s.page, s.type, s.score)))
+            if room < MIN_PARTIAL_TOKENS:
+                stats.dropped_over_budget += 1
+                continue
+            block = format_snippet(Snippet(_truncate_to_tokens(text, room), s.page, s.type, s.score))
+            cost = estimate_tokens(block)
+            stats.notes.append(f"truncated page {s.page} snippet to fit budget")
+        kept_shingles.append(sh)
+        blocks.append(block)
+        used += cost
+    stats.output_tokens = used
+    return blocks, stats
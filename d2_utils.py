@@ -1,23 +1,233 @@
 #Telling LLM how to generate D2 diagram code and rendering them to SVGs
-import re, subprocess, tempfile, textwrap
+import os, re, shutil, subprocess, tempfile, textwrap, logging, threading, asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 from llm_bridge import answer_with_llama  
+from cache_utils import LRUCache, content_key
+logger = logging.getLogger(__name__)
+D2_THEME = os.getenv("D2_THEME", "0") #d2's default theme id
+D2_CACHE_DIR = os.getenv("D2_CACHE_DIR", ".cache/d2_svgs")
+D2_CACHE_MAX_MB = int(os.getenv("D2_CACHE_MAX_MB", "256"))
+D2_RENDER_WORKERS = int(os.getenv("D2_RENDER_WORKERS", "2")) #max concurrent d2 processes per app process
+D2_RENDER_TIMEOUT = float(os.getenv("D2_RENDER_TIMEOUT", "20"))
+D2_RENDER_MEMORY_MB = int(os.getenv("D2_RENDER_MEMORY_MB", "4096")) #address-space cap per d2 process, 0 disables
+D2_RENDER_QUEUE_MAX = int(os.getenv("D2_RENDER_QUEUE_MAX", "16")) #renders waiting beyond this are rejected
+_evict_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_render_pool: Optional[ThreadPoolExecutor] = None
+_inflight: Dict[str, Future] = {}
+_failed_renders = LRUCache(maxsize=256, ttl=600) #source d2 rejected fails fast on the next rerun instead of re-forking d2
+_render_stats = {
+    "queued": 0, "running": 0, "completed": 0, "failed": 0, "timeouts": 0,
+    "rejected": 0, "cache_hits": 0, "coalesced": 0,
+}
 def extract_d2_block(response_text: str) -> str:
     match = re.search(r"```d2(.*?)```", response_text, re.DOTALL | re.IGNORECASE)
     if match:
         return match.group(1).strip()
     match2 = re.search(r"```(.*?)```", response_text, re.DOTALL)
     return match2.group(1).strip() if match2 else response_text.strip()
-def render_d2_to_svg(d2_code: str) -> str:
-    """Renders a D2 code string into an SVG file using the D2 CLI."""
+@lru_cache(maxsize=1)
+def d2_version() -> str:
+    try:
+        out = subprocess.run(["d2", "--version"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+def svg_cache_key(d2_code: str, theme: str = D2_THEME) -> str:
+    #a new d2 release or theme renders differently, so both are part of the key
+    return content_key("d2", d2_version(), theme, d2_code.strip())
+def _cached_svg_path(key: str) -> str:
+    return os.path.join(D2_CACHE_DIR, f"{key}.svg")
+def _evict_svg_cache() -> None:
+    max_bytes = D2_CACHE_MAX_MB * 1024 * 1024
+    with _evict_lock:
+        try:
+            entries = [e for e in os.scandir(D2_CACHE_DIR) if e.name.endswith(".svg") and not e.name.endswith(".tmp.svg")]
+        except FileNotFoundError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in stats)
+        if total <= max_bytes:
+            return
+        target = int(max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in sorted(stats): #oldest first; hits refresh mtime
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        logger.info(f"D2 SVG cache: evicted {evicted} diagrams.")
+class _D2SourceError(RuntimeError):
+    #d2 ran and rejected the source; the same source fails the same way, so only these are remembered
+    pass
+@lru_cache(maxsize=1)
+def _prlimit_binary() -> Optional[str]:
+    return shutil.which("prlimit")
+def _d2_command(d2_path: str, svg_path: str) -> List[str]:
+    cmd = ["d2", "--theme", D2_THEME, d2_path, svg_path]
+    if D2_RENDER_MEMORY_MB <= 0:
+        return cmd
+    prlimit = _prlimit_binary() #util-linux; sets the cap before exec without a preexec_fn in a threaded parent
+    if prlimit is None:
+        logger.debug("prlimit not found, rendering D2 without a memory cap.")
+        return cmd
+    return [prlimit, f"--as={D2_RENDER_MEMORY_MB * 1024 * 1024}", *cmd]
+def _run_d2(d2_code: str, svg_path: str) -> None:
     with tempfile.NamedTemporaryFile(suffix=".d2", delete=False, mode="w") as f:
         f.write(d2_code)
         d2_path = f.name
-    svg_path = d2_path.replace(".d2", ".svg")
     try:
-        subprocess.run(["d2", d2_path, svg_path], check=True)
+        subprocess.run(
+            _d2_command(d2_path, svg_path),
+            check=True,
+            capture_output=True,
+            timeout=D2_RENDER_TIMEOUT, #the child is killed on expiry
+        )
+    except subprocess.TimeoutExpired:
+        _bump("timeouts")
+        raise RuntimeError(f"D2 rendering timed out after {D2_RENDER_TIMEOUT:g}s")
     except subprocess.CalledProcessError as e:
+        if e.returncode > 0:
+            raise _D2SourceError(f"D2 rendering failed: {e}")
+        raise RuntimeError(f"D2 rendering failed: {e}") #killed by a signal, e.g. the OOM killer
+    except (OSError, subprocess.SubprocessError) as e: #missing d2 binary, fork failing under memory pressure
+        raise RuntimeError(f"D2 could not be run: {e}")
+    finally:
+        try:
+            os.remove(d2_path)
+        except OSError:
+            pass
+def _render_uncached(d2_code: str, key: str) -> str:
+    with _stats_lock:
+        _render_stats["queued"] -= 1
+        _render_stats["running"] += 1
+    try:
+        if D2_CACHE_MAX_MB <= 0:
+            fd, svg_path = tempfile.mkstemp(suffix=".svg")
+            os.close(fd)
+            _run_d2(d2_code, svg_path)
+            _bump("completed")
+            return svg_path
+        svg_path = _cached_svg_path(key)
+        os.makedirs(D2_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{svg_path}.{os.getpid()}.{threading.get_ident()}.tmp.svg"
+        try:
+            _run_d2(d2_code, tmp_path)
+            os.replace(tmp_path, svg_path) #atomic, a concurrent render of the same source just overwrites with identical bytes
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _evict_svg_cache()
+        _bump("completed")
+        return svg_path
+    except _D2SourceError as e:
+        _bump("failed")
+        _failed_renders.set(key, str(e))
+        raise
+    except RuntimeError: #timeouts and environment failures may pass on retry, so they are not remembered
+        _bump("failed")
+        raise
+    except OSError as e:
+        _bump("failed")
         raise RuntimeError(f"D2 rendering failed: {e}")
-    return svg_path
+    finally:
+        with _stats_lock:
+            _render_stats["running"] -= 1
+def _get_render_pool() -> ThreadPoolExecutor:
+    #threads only wait on d2 subprocesses, so the pool size is the cap on concurrent d2 processes
+    global _render_pool
+    if _render_pool is None:
+        with _stats_lock:
+            if _render_pool is None:
+                _render_pool = ThreadPoolExecutor(max_workers=D2_RENDER_WORKERS, thread_name_prefix="d2-render")
+    return _render_pool
+def _bump(name: str) -> None:
+    with _stats_lock:
+        _render_stats[name] += 1
+def _forget_inflight(key: str, future: Future) -> None:
+    with _stats_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+def submit_render(d2_code: str) -> "Future[str]":
+    key = svg_cache_key(d2_code)
+    svg_path = _cached_svg_path(key)
+    if D2_CACHE_MAX_MB > 0 and os.path.exists(svg_path):
+        os.utime(svg_path) #LRU bookkeeping for eviction
+        _bump("cache_hits")
+        done: "Future[str]" = Future()
+        done.set_result(svg_path)
+        return done
+    previous_error = _failed_renders.get(key)
+    if previous_error is not None:
+        raise RuntimeError(previous_error)
+    with _stats_lock:
+        inflight = _inflight.get(key)
+        if inflight is not None: #same diagram already rendering for another session
+            _render_stats["coalesced"] += 1
+            return inflight
+        if _render_stats["queued"] >= D2_RENDER_QUEUE_MAX:
+            _render_stats["rejected"] += 1
+            raise RuntimeError("D2 renderer is busy, try again shortly")
+        _render_stats["queued"] += 1
+    try:
+        future = _get_render_pool().submit(_render_uncached, d2_code, key)
+    except Exception:
+        with _stats_lock:
+            _render_stats["queued"] -= 1
+        raise
+    with _stats_lock:
+        _inflight[key] = future
+    future.add_done_callback(lambda f: _forget_inflight(key, f)) #runs immediately if the render already finished
+    return future
+def render_d2_to_svg(d2_code: str) -> str:
+    """Renders a D2 code string into an SVG file using the D2 CLI, reusing the cached SVG for identical source."""
+    return submit_render(d2_code).result()
+async def render_d2_to_svg_async(d2_code: str) -> str:
+    return await asyncio.wrap_future(submit_render(d2_code))
+def render_stats() -> Dict[str, int]:
+    with _stats_lock:
+        stats = dict(_render_stats)
+    stats["workers"] = D2_RENDER_WORKERS
+    stats["queue_max"] = D2_RENDER_QUEUE_MAX
+    return stats
+def stored_svg_name(d2_code: str) -> str:
+    return f"{svg_cache_key(d2_code)}.svg"
+def store_rendered_svg(d2_code: str, svg_path: str, upload: Callable[[str, bytes], str]) -> Optional[str]:
+    #pushes a rendered diagram to durable storage; returns the stored path to save with the chat turn, None on failure
+    try:
+        with open(svg_path, "rb") as f:
+            return upload(stored_svg_name(d2_code), f.read())
+    except Exception as e:
+        logger.warning(f"Could not persist diagram SVG: {e}")
+        return None
+def load_stored_svg(stored_path: str, download: Callable[[str], bytes]) -> str:
+    #local cache first, then durable storage; the stored name is the same content hash the local cache uses
+    name = os.path.basename(stored_path)
+    if not re.fullmatch(r"[0-9a-f]{64}\.svg", name):
+        raise ValueError(f"Not a stored diagram path: {stored_path}")
+    local = os.path.join(D2_CACHE_DIR, name)
+    if D2_CACHE_MAX_MB > 0 and os.path.exists(local):
+        os.utime(local)
+        return local
+    data = download(stored_path)
+    if D2_CACHE_MAX_MB <= 0:
+        fd, local = tempfile.mkstemp(suffix=".svg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return local
+    os.makedirs(D2_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{local}.{os.getpid()}.{threading.get_ident()}.tmp.svg"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, local)
+    _evict_svg_cache()
+    return local
 def llm_generate_d2(context_text: str, user_query: str) -> dict:
     prompt = textwrap.dedent(f"""
         You are a specialized Large Language Model that acts as a **Diagram Context Interpreter and D2 Code Generator**
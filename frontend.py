@@ -3,27 +3,45 @@ from __future__ import annotations
 import os
 import json
 import streamlit as st
-from groq import Groq
 from claude_mcp_client import ClaudeMCPClient
 from s2_client import search_papers
 from content_resolver import resolve_pdf_url_from_s2_item
-from d2_utils import llm_generate_d2, render_d2_to_svg
-from llm_bridge import answer_with_llama, answer_with_claude
+from d2_utils import llm_generate_d2, render_d2_to_svg, render_stats, store_rendered_svg, load_stored_svg
+from llm_bridge import answer_with_claude, stream_with_llama, stream_with_claude
+from llm_clients import get_groq_client, llm_slot
 from mcp_integration import WebSearchClient
 from supabase_client import (
     create_user,
     authenticate_user,
     create_paper,
     list_papers_for_user,
+    invalidate_user_lookups,
+    lookup_cache_stats,
     append_chat_turn,
-    get_chat_history,
+    get_chat_history_page,
+    CHAT_PAGE_SIZE,
+    get_ingest_jobs,
+    list_ingest_jobs_for_user,
+    update_paper_status,
+    upload_diagram_svg,
+    download_diagram_svg,
+    READY_STATUSES,
 )
 from hybrid_partition_ingest import (
-    ingest_paper_for_user,
-    ingest_paper_from_file,
     build_llm_context,
+    build_llm_context_batch,
     build_bm25_from_chunks,
+    get_or_create_index,
+    ensure_index_ready,
+    query_cache_stats,
+    invalidate_paper_cache,
+    delete_paper_for_user,
+    embed_queries,
 )
+from latency import latency_summary
+from query_router import route_and_retrieve, route_general_message, router_stats, intent_stats
+from ingest_jobs import submit_url_ingest, submit_file_ingest, recover_stale_jobs, ACTIVE_STATUSES
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
 st.set_page_config(page_title="ResearchMCP-The new", page_icon="🪐", layout="wide")
 st.markdown(
     """
@@ -65,14 +83,137 @@ def exit_paper_mode():
         "paper_title": None,
         "bm25": None,
         "memory": st.session_state.get("general_memory", []).copy(),
+        "history_before_id": None,
+        "history_visible": CHAT_PAGE_SIZE,
     })
-def save_to_memory(question: str, answer: str, source_type: str, d2_code: str = None):
+def save_to_memory(question: str, answer: str, source_type: str, d2_code: str = None, svg_path: str = None):
     st.session_state["memory"].append({
         "question": question,
         "answer": answer,
         "d2_code": d2_code,
+        "svg_path": svg_path,
         "source_type": source_type,
     })
+def diagram_file_for_turn(turn: dict) -> str:
+    #stored SVG first (local cache or storage download), re-render from d2_code only as a last resort
+    if turn.get("svg_path"):
+        try:
+            return load_stored_svg(turn["svg_path"], download_diagram_svg)
+        except Exception:
+            if not turn.get("d2_code"):
+                raise
+    return render_d2_to_svg(turn["d2_code"])
+def load_paper_into_session(paper_id: int, title: str, pdf_url: str):
+    if st.session_state["mode"] == "general":
+        st.session_state["general_memory"] = st.session_state["memory"].copy()
+    st.session_state.update({
+        "paper_id": paper_id,
+        "paper_title": title,
+        "pdf_url": pdf_url,
+        "paper_ingested": True,
+        "s2_results": None,
+        "show_research_form": False,
+        "mode": "research",
+    })
+    try:
+        st.session_state["bm25"] = build_bm25_from_chunks(st.session_state["user_id"], paper_id)
+    except Exception as e:
+        st.error(f"BM25 load failed: {e}")
+        st.session_state["bm25"] = None
+    turns, before_id = get_chat_history_page(
+        user_id=st.session_state["user_id"],
+        paper_id=paper_id,
+    )
+    st.session_state["memory"] = turns
+    st.session_state["history_before_id"] = before_id
+    st.session_state["history_visible"] = CHAT_PAGE_SIZE
+def load_older_turns():
+    #reveal turns already in memory first, only go to the database once those run out
+    hidden = len(st.session_state["memory"]) - st.session_state["history_visible"]
+    if hidden <= 0 and st.session_state.get("history_before_id") is not None:
+        older, before_id = get_chat_history_page(
+            user_id=st.session_state["user_id"],
+            paper_id=st.session_state["paper_id"],
+            before_id=st.session_state["history_before_id"],
+        )
+        st.session_state["memory"] = older + st.session_state["memory"]
+        st.session_state["history_before_id"] = before_id
+    st.session_state["history_visible"] += CHAT_PAGE_SIZE
+def track_ingest_job(job: dict, paper_id: int, title: str, pdf_url: str):
+    st.session_state["ingest_jobs"].append({
+        "job_id": job["id"],
+        "paper_id": paper_id,
+        "title": title,
+        "pdf_url": pdf_url,
+        "status": job.get("status", "queued"),
+    })
+def restore_ingest_jobs(user_id: str) -> list:
+    #a reload starts a new session, the ingest_jobs table still knows which of the user's papers are in flight
+    tracked = []
+    for job in list_ingest_jobs_for_user(user_id, ACTIVE_STATUSES):
+        paper = job.get("papers") or {}
+        tracked.append({
+            "job_id": job["id"],
+            "paper_id": job["paper_id"],
+            "title": paper.get("title") or f"Paper {job['paper_id']}",
+            "pdf_url": paper.get("pdf_url") or "",
+            "status": job["status"],
+        })
+    return tracked
+def submit_ingest_or_fail(submit, paper_id: int, **kwargs) -> dict:
+    #the paper row already exists, so a failed submit must not leave it queued forever
+    try:
+        return submit(paper_id=paper_id, **kwargs)
+    except Exception:
+        try:
+            update_paper_status(st.session_state["user_id"], paper_id, "failed")
+        except Exception:
+            pass
+        raise
+def render_ingest_jobs():
+    tracked = st.session_state["ingest_jobs"]
+    rows = {j["id"]: j for j in get_ingest_jobs([t["job_id"] for t in tracked])}
+    finished_now = False
+    for t in list(tracked):
+        job = rows.get(t["job_id"]) or {}
+        status = job.get("status", t["status"])
+        if t["status"] in ACTIVE_STATUSES and status not in ACTIVE_STATUSES:
+            finished_now = True
+            invalidate_paper_cache(st.session_state["namespace"], t["paper_id"])
+            invalidate_user_lookups(st.session_state["user_id"]) #status was written by the worker process
+        t["status"] = status
+        if status in ACTIVE_STATUSES:
+            st.progress(float(job.get("progress") or 0.0), text=f"Ingesting '{t['title']}' — {status}")
+        elif status == "ready":
+            c1, c2 = st.columns([5, 1])
+            c1.success(f"Ready: {t['title']} ({job.get('num_vectors') or 0} vectors)")
+            if c2.button("Open", key=f"open_job_{t['job_id']}"):
+                tracked.remove(t)
+                load_paper_into_session(t["paper_id"], t["title"], t["pdf_url"])
+                st.rerun()
+        else:
+            c1, c2 = st.columns([5, 1])
+            c1.error(f"Ingest failed for '{t['title']}': {job.get('error') or 'unknown error'}")
+            if c2.button("Dismiss", key=f"dismiss_job_{t['job_id']}"):
+                tracked.remove(t)
+                st.rerun()
+    if finished_now: #full rerun so the paper list picks up the new status and polling stops
+        st.rerun()
+@st.fragment(run_every=INGEST_POLL_SECONDS)
+def poll_ingest_jobs():
+    render_ingest_jobs()
+@st.cache_resource
+def recover_ingest_jobs() -> int:
+    #once per server process: fail jobs a previous (crashed or restarted) worker pool left active
+    try:
+        return recover_stale_jobs()
+    except Exception as e:
+        st.warning(f"Could not check for interrupted ingests: {e}")
+        return 0
+@st.cache_resource
+def warm_up_index():
+    #connect to the vector index and check readiness once per server process instead of on every question
+    return ensure_index_ready(get_or_create_index())
 def ensure_bm25():
     if "bm25" not in st.session_state or st.session_state["bm25"] is None:
         st.session_state["bm25"] = build_bm25_from_chunks(
@@ -130,16 +271,17 @@ Return ONLY this JSON (nothing before or after):
     if not api_key:
         return {"needs_rewriting": False, "rewritten_query": user_query}
     try:
-        client = Groq(api_key=api_key)
-        resp = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_query},
-            ],
-            model="llama-3.1-8b-instant",
-            max_tokens=256,
-            temperature=0,
-        )
+        client = get_groq_client()
+        with llm_slot("groq"):
+            resp = client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_query},
+                ],
+                model="llama-3.1-8b-instant",
+                max_tokens=256,
+                temperature=0,
+            )
         raw = resp.choices[0].message.content
         return json.loads(raw)
     except Exception:
@@ -167,6 +309,9 @@ DEFAULT_KEYS = [
     "paper_ingested",
     "s2_results",
     "show_research_form",
+    "ingest_jobs",
+    "history_before_id",
+    "history_visible",
 ]
 for k in DEFAULT_KEYS:
     st.session_state.setdefault(k, None)
@@ -176,6 +321,8 @@ if st.session_state["general_memory"] is None:
     st.session_state["general_memory"] = []
 if "mode" not in st.session_state:
     st.session_state["mode"] = "general"
+if st.session_state["history_visible"] is None:
+    st.session_state["history_visible"] = CHAT_PAGE_SIZE
 if st.session_state["show_research_form"] is None:
     st.session_state["show_research_form"] = False
 if st.session_state["user_id"] is None:
@@ -219,6 +366,13 @@ if st.session_state["user_id"] is None:
                     st.success("Account created.")
                     st.rerun()
     st.stop()
+recover_ingest_jobs()
+if st.session_state["ingest_jobs"] is None:
+    try:
+        st.session_state["ingest_jobs"] = restore_ingest_jobs(st.session_state["user_id"])
+    except Exception as e:
+        st.session_state["ingest_jobs"] = []
+        st.warning(f"Could not load ingestion jobs: {e}")
 top1, top2 = st.columns([3, 1])
 with top1:
     st.title("ResearchMCP")
@@ -233,32 +387,40 @@ with st.expander("Your Ingested Papers", expanded=False):
     if not user_papers:
         st.info("No papers ingested yet.")
     else:
-        options = {f"{p['title']} ({str(p['created_at'])[:10]})": p for p in user_papers}
+        options = {}
+        for p in user_papers:
+            label = f"{p['title']} ({str(p['created_at'])[:10]})"
+            if p.get("status") not in READY_STATUSES:
+                label += f" [{p.get('status')}]"
+            options[label] = p
         selected = st.selectbox("Select a paper:", list(options.keys()))
         paper = options[selected]
-        if st.button("Load Paper"):
-            st.session_state["paper_id"] = paper["id"]
-            st.session_state["paper_title"] = paper["title"]
-            st.session_state["pdf_url"] = paper["pdf_url"]
-            st.session_state["paper_ingested"] = True
+        load_col, delete_col = st.columns([1, 1])
+        if load_col.button("Load Paper"):
+            if paper.get("status") not in READY_STATUSES:
+                st.warning(f"This paper is not ready yet (status: {paper.get('status')}).")
+            else:
+                load_paper_into_session(paper["id"], paper["title"], paper["pdf_url"])
+                st.success(f"Loaded: {paper['title']}")
+                st.rerun()
+        if delete_col.button("Delete Paper"):
             try:
-                bm25 = build_bm25_from_chunks(
+                delete_paper_for_user(
                     st.session_state["user_id"],
-                    st.session_state["paper_id"]
+                    st.session_state["namespace"],
+                    paper["id"],
                 )
-                st.session_state["bm25"] = bm25
+                if st.session_state.get("paper_id") == paper["id"]:
+                    exit_paper_mode()
+                st.rerun()
             except Exception as e:
-                st.error(f"BM25 rebuild failed: {e}")
-                st.session_state["bm25"] = None
-
-            st.session_state["memory"] = get_chat_history(
-                user_id=st.session_state["user_id"],
-                paper_id=paper["id"],
-                limit=50,
-            )
-            st.session_state["mode"] = "research"
-            st.success(f"Loaded: {paper['title']}")
-            st.rerun()
+                st.error(f"Failed to delete paper: {e}")
+if st.session_state["ingest_jobs"]:
+    with st.expander("Ingestion Jobs", expanded=True):
+        if any(t["status"] in ACTIVE_STATUSES for t in st.session_state["ingest_jobs"]):
+            poll_ingest_jobs()
+        else:
+            render_ingest_jobs()
 if st.session_state["mode"] == "research" and st.session_state.get("paper_ingested"):
     st.info(f"**Active Paper:** {st.session_state['paper_title']}")
     if st.button("Exit Paper Mode"):
@@ -267,11 +429,17 @@ if st.session_state["mode"] == "research" and st.session_state.get("paper_ingest
 else:
     st.info("**General Chat Mode** — Ask anything or search for a research paper")
 MainClaude = ClaudeMCPClient(request_timeout=60)
+index_error = warm_up_index()
+if index_error:
+    st.warning(f"Vector index is not reachable, paper questions may fail: {index_error}")
 st.markdown("---")
 st.subheader("Chat")
 chat_container = st.container()
 with chat_container:
-    for turn in st.session_state["memory"]:
+    visible = st.session_state["history_visible"]
+    if len(st.session_state["memory"]) > visible or st.session_state.get("history_before_id") is not None:
+        st.button("Load older messages", on_click=load_older_turns)
+    for turn in st.session_state["memory"][-visible:]:
         with st.chat_message("user"):
             st.write(turn["question"])
         with st.chat_message("assistant"):
@@ -284,10 +452,9 @@ with chat_container:
                 st.caption("From knowledge")
             elif source_type == "system":
                 st.caption("System")
-            if turn.get("d2_code"):
+            if turn.get("d2_code") or turn.get("svg_path"):
                 try:
-                    svg_path = render_d2_to_svg(turn["d2_code"])
-                    st.image(svg_path, width=800)
+                    st.image(diagram_file_for_turn(turn), width=800)
                 except Exception:
                     st.write(turn.get("answer", "Diagram generated."))
             else:
@@ -324,39 +491,29 @@ if st.session_state.get("show_research_form"):
             elif not upload_title.strip():
                 st.error("Please enter a title.")
             else:
-                with st.spinner(f"Ingesting '{upload_title}'..."):
-                    try:
-                        file_bytes = uploaded_file.read()
-                        paper_row = create_paper(
-                            user_id=st.session_state["user_id"],
-                            title=upload_title.strip(),
-                            pdf_url=f"uploaded://{uploaded_file.name}",
-                        )
-                        paper_id = paper_row["id"]
-                        result = ingest_paper_from_file(
-                            file_bytes=file_bytes,
-                            user_id=st.session_state["user_id"],
-                            namespace=st.session_state["namespace"],
-                            paper_id=paper_id,
-                            paper_title=upload_title.strip(),
-                        )
-                        if st.session_state["mode"] == "general":
-                            st.session_state["general_memory"] = st.session_state["memory"].copy()
-                        st.session_state.update({
-                            "paper_id": paper_id,
-                            "paper_title": upload_title.strip(),
-                            "pdf_url": f"uploaded://{uploaded_file.name}",
-                            "paper_ingested": True,
-                            "bm25": result["bm25"],
-                            "s2_results": None,
-                            "show_research_form": False,
-                            "mode": "research",
-                            "memory": [],
-                        })
-                        st.success(f"Paper ingested: {upload_title}")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Failed to ingest: {e}") 
+                try:
+                    file_bytes = uploaded_file.read()
+                    pdf_url = f"uploaded://{uploaded_file.name}"
+                    paper_row = create_paper(
+                        user_id=st.session_state["user_id"],
+                        title=upload_title.strip(),
+                        pdf_url=pdf_url,
+                    )
+                    paper_id = paper_row["id"]
+                    job = submit_ingest_or_fail(
+                        submit_file_ingest,
+                        user_id=st.session_state["user_id"],
+                        namespace=st.session_state["namespace"],
+                        paper_id=paper_id,
+                        paper_title=upload_title.strip(),
+                        file_bytes=file_bytes,
+                        file_name=uploaded_file.name,
+                    )
+                    track_ingest_job(job, paper_id, upload_title.strip(), pdf_url)
+                    st.session_state["show_research_form"] = False
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to queue ingest: {e}")
 if st.session_state.get("s2_results"):
     results = st.session_state["s2_results"]
     st.markdown("---")
@@ -382,37 +539,30 @@ if st.session_state.get("s2_results"):
                 if not pdf_url:
                     st.error("Could not find PDF URL for this paper.")
                 else:
-                    with st.spinner(f"Ingesting '{chosen['title']}'..."):
+                    try:
                         paper_row = create_paper(
                             user_id=st.session_state["user_id"],
                             title=chosen["title"],
                             pdf_url=pdf_url,
                         )
                         paper_id = paper_row["id"]
-                        result = ingest_paper_for_user(
-                            pdf_url=pdf_url,
+                        job = submit_ingest_or_fail(
+                            submit_url_ingest,
                             user_id=st.session_state["user_id"],
                             namespace=st.session_state["namespace"],
                             paper_id=paper_id,
                             paper_title=chosen["title"],
+                            pdf_url=pdf_url,
                         )
-                        if st.session_state["mode"] == "general":
-                            st.session_state["general_memory"] = st.session_state["memory"].copy()
+                        track_ingest_job(job, paper_id, chosen["title"], pdf_url)
                         st.session_state.update({
-                            "paper_id": paper_id,
-                            "paper_title": chosen["title"],
-                            "pdf_url": pdf_url,
-                            "paper_ingested": True,
-                            "bm25": result["bm25"],
                             "s2_results": None,
                             "chosen_idx": None,
                             "paper_question": None,
-                            "mode": "research",
-                            "memory": [],  
                         })
-                    
-                    st.success(f"Paper ingested: {chosen['title']}")
-                    st.rerun()
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Failed to queue ingest: {e}")
         with col2:
             if st.button("Cancel"):
                 st.session_state["s2_results"] = None
@@ -420,6 +570,40 @@ if st.session_state.get("s2_results"):
 if st.session_state["mode"] == "research" and st.session_state.get("paper_ingested"):
     placeholder = f"Ask about '{st.session_state['paper_title']}' or anything else..."
     col1, col2 = st.columns([6, 1])
+    with col1:
+        with st.expander("Ask several questions at once", expanded=False):
+            with st.form("batch_questions_form"):
+                batch_text = st.text_area("One question per line:", height=120)
+                batch_submitted = st.form_submit_button("Answer All")
+            if batch_submitted:
+                questions = [q.strip() for q in batch_text.splitlines() if q.strip()]
+                if questions:
+                    with st.spinner(f"Answering {len(questions)} questions..."):
+                        try:
+                            contexts = build_llm_context_batch(
+                                st.session_state["user_id"],
+                                st.session_state["paper_id"],
+                                questions,
+                                ensure_bm25(),
+                                namespace=st.session_state["namespace"],
+                            )
+                            for q, context in zip(questions, contexts):
+                                answer = answer_with_claude(
+                                    context_text=context,
+                                    question=q,
+                                    model="claude-3-haiku-20240307",
+                                    max_tokens=1024,
+                                )
+                                save_to_memory(q, answer, "paper")
+                                append_chat_turn(
+                                    user_id=st.session_state["user_id"],
+                                    paper_id=st.session_state["paper_id"],
+                                    question=q,
+                                    answer=answer,
+                                )
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error: {e}")
     with col2:
         if st.button("Exit Paper", key="exit_bottom"):
             exit_paper_mode()
@@ -441,48 +625,67 @@ if user_input:
             with st.chat_message("assistant"):
                 with st.spinner("Searching paper..."):
                     try:
+                        timings = {}
                         bm25 = ensure_bm25()
-                        rewrite = new_groq_rewrite(user_input)
+                        user_id = st.session_state["user_id"]
+                        paper_id = st.session_state["paper_id"]
+                        namespace = st.session_state["namespace"]
+                        route, context = route_and_retrieve(
+                            user_input,
+                            new_groq_rewrite,
+                            lambda q, t: build_llm_context(
+                                user_id, paper_id, q, bm25, timings=t, namespace=namespace, record_latency=False
+                            ),
+                            embed=embed_queries,
+                            timings=timings,
+                        )
+                        rewrite = route.as_rewrite()
                         if rewrite["needs_rewriting"]:
-                            retrieval_q = rewrite["rewritten_query"] or user_input
-                            context = build_llm_context(
-                                st.session_state["user_id"],
-                                st.session_state["paper_id"],
-                                retrieval_q,
-                                bm25,
-                            )
                             d2_result = llm_generate_d2(context, user_input)
                             d2_code = d2_result.get("d2_code", "").strip()
+                            stored_svg = None
                             if not d2_code:
                                 answer = "Diagram generation failed — no valid D2 code returned."
                                 st.error(answer)
                                 d2_code = None
                             else:
-                                svg_path = render_d2_to_svg(d2_code)
-                                st.image(svg_path, width=800)
-                                answer = "Diagram generated from paper context."
+                                try:
+                                    svg_path = render_d2_to_svg(d2_code)
+                                    st.image(svg_path, width=800)
+                                    stored_svg = store_rendered_svg(d2_code, svg_path, upload_diagram_svg)
+                                    answer = "Diagram generated from paper context."
+                                except RuntimeError as render_error: #timeout, busy renderer or bad D2: show the source instead
+                                    st.warning(f"Diagram could not be rendered: {render_error}")
+                                    st.code(d2_code, language="d2")
+                                    answer = "Diagram code generated from paper context (rendering failed)."
                         else:
-                            context = build_llm_context(
-                                st.session_state["user_id"],
-                                st.session_state["paper_id"],
-                                user_input,
-                                bm25,
-                            )
-                            answer = answer_with_claude(
+                            answer = st.write_stream(stream_with_claude(
                                 context_text=context,
                                 question=user_input,
                                 model="claude-3-haiku-20240307",
                                 max_tokens=1024,
-                            )
-                            st.write(answer)
+                            ))
                             d2_code = None
-                        save_to_memory(user_input, answer, "paper", d2_code)
+                            stored_svg = None
+                        if os.getenv("DEBUG_MODE") == "true":
+                            with st.expander("Retrieval latency", expanded=False):
+                                st.json({
+                                    "this_question": timings,
+                                    "recent": latency_summary(),
+                                    "query_cache": query_cache_stats(),
+                                    "lookup_cache": lookup_cache_stats(),
+                                    "d2_render": render_stats(),
+                                    "route": {"source": route.source, "reason": route.reason, **rewrite},
+                                    "router": router_stats(),
+                                })
+                        save_to_memory(user_input, answer, "paper", d2_code, stored_svg)
                         append_chat_turn(
                             user_id=st.session_state["user_id"],
                             paper_id=st.session_state["paper_id"],
                             question=user_input,
                             answer=answer,
                             d2_code=d2_code,
+                            svg_path=stored_svg,
                         )
                     except Exception as e:
                         st.error(f"Error: {e}")
@@ -503,18 +706,32 @@ if user_input:
                         for turn in st.session_state["memory"][-5:]:
                             recent_history.append({"role": "user", "content": turn["question"]})
                             recent_history.append({"role": "assistant", "content": turn["answer"]})
-                        resp = MainClaude.send_message(
-                            json.dumps(claude_input),
-                            conversation_history=recent_history
-                        )
+                        intent = route_general_message(user_input)
+                        if intent is not None:
+                            resp = intent.as_response()
+                            streamed_text = ""
+                        else:
+                            #one streamed call decides and answers: direct answers appear as they are generated,
+                            #a tool call comes back reassembled on stream.result
+                            stream = MainClaude.stream_message(
+                                json.dumps(claude_input),
+                                conversation_history=recent_history
+                            )
+                            streamed = st.empty()
+                            with streamed.container():
+                                streamed_text = st.write_stream(stream)
+                            resp = stream.result
+                            if resp.get("__tool_name") not in (None, "direct_answer"):
+                                streamed.empty() #preamble before a tool call is not the answer
                         tool = resp.get("__tool_name")
                         payload = resp.get("__tool_payload")
                         if os.getenv("DEBUG_MODE") == "true":
                             with st.expander("Debug Info", expanded=False):
-                                st.json(resp)
+                                st.json({"response": resp, "routing": intent_stats()})
                         if not tool or tool == "direct_answer":
                             answer = _extract_claude_text(resp)
-                            st.write(answer)
+                            if not streamed_text:
+                                st.write(answer)
                             save_to_memory(user_input, answer, "knowledge")
                         elif tool == "web_search":
                             query = (payload or {}).get("query", "").strip()
@@ -532,13 +749,12 @@ if user_input:
                                         f"Title: {r.title}\nURL: {r.url}\nSummary: {r.description}"
                                     )
                                 web_context = "\n\n".join(context_chunks)
-                                answer = answer_with_llama(
+                                answer = st.write_stream(stream_with_llama(
                                     context_text=web_context,
                                     question=f"Using the web search context above, answer: {user_input}",
                                     model="llama-3.1-8b-instant",
                                     max_tokens=512,
-                                )
-                                st.write(answer)
+                                ))
                                 with st.expander("Sources", expanded=False):
                                     for r in results:
                                         st.markdown(f"**{r.title}**")
@@ -575,6 +791,7 @@ with col1:
     else:
         if st.button("Yes, Clear"):
             st.session_state["memory"] = []
+            st.session_state["history_before_id"] = None
             st.session_state["last_response"] = None
             st.session_state["bm25"] = None
             st.session_state["show_research_form"] = False
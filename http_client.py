@@ -0,0 +1,58 @@
+#one pooled requests.Session per process so repeat calls to the same host reuse keep-alive connections
+#instead of paying a TCP+TLS handshake every time
+from __future__ import annotations
+import os
+import threading
+from typing import Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10")) #number of hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20")) #connections kept alive per host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_USER_AGENT = "researchmcp/1.0"
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+def _retry_policy() -> Retry:
+    #connection failures are retried for any method (nothing reached the server); status/read retries only
+    #for idempotent methods so an LLM POST is never sent twice
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+def build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=_retry_policy(),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.setdefault("User-Agent", HTTP_USER_AGENT)
+    return session
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+def timeout(read: float) -> Tuple[float, float]:
+    #(connect, read): fail fast on unreachable hosts while letting slow generations finish
+    return (min(HTTP_CONNECT_TIMEOUT, read), read)
+def close_session() -> None:
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -1,26 +1,58 @@
 from __future__ import annotations
-import os, re, uuid, logging, json, time, tempfile
-from typing import List, Dict, Any, Optional, Tuple
+import os, re, uuid, logging, json, time, hashlib, threading
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from supabase_client import (
+    delete_paper,
     save_paper_chunks,
     get_chunks_for_paper,
+    get_chunk_vectors_page,
     get_user_by_id,
+    list_papers_for_user,
+    list_ingest_jobs_for_paper,
+    READY_STATUSES,
     save_bm25_state,
     load_bm25_state,
 )
-from langchain.schema import Document
 from sentence_transformers import SentenceTransformer
 from pinecone_text.sparse import BM25Encoder
 from pinecone import Pinecone, ServerlessSpec
 from landingai_ade import LandingAIADE
+from vector_backends import VectorBackend, PineconeBackend, LocalBackend
+from cache_utils import DiskCache, LRUCache, ParseCache, TieredCache, content_key, normalize_text
+from ingest_pipeline import run_stages
+from upsert_writer import BatchedUpserter
+from latency import timed, record_query_latency
+from context_builder import Snippet, assemble_context
+from ingest_jobs import ACTIVE_STATUSES
+from vector_codec import encode_dense, decode_dense, encode_sparse, decode_sparse
+from bm25_state import BM25_STATE_VERSION, fit_bm25, bm25_to_state, bm25_from_state, is_legacy_bm25_state
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "researchmcp")
 PINECONE_DIMENSION = 768
 PINECONE_METRIC = "dotproduct"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower() #"pinecone" or "local"
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".local_index")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024")) #entries per query vector LRU
+QUERY_CACHE_DISK_MB = int(os.getenv("QUERY_CACHE_DISK_MB", "0")) #optional disk tier, 0 = memory only
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", ".cache/query_vectors.sqlite")
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")) #formatted contexts kept per process
+BATCH_QUERY_WORKERS = int(os.getenv("BATCH_QUERY_WORKERS", "8")) #concurrent index queries in build_llm_context_batch
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")) #upper bound on staleness when another process re-ingests
+EMBED_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".cache/embeddings.sqlite")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512")) #0 disables the cache
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64")) #chunks per embed/upsert batch
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "2")) #batches allowed to wait between two stages
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", "1000")) #stored chunk rows fetched per page when reindexing
+ADE_MODEL = os.getenv("ADE_MODEL", "dpt-2-latest")
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", ".cache/ade_parses.sqlite")
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "1024")) #0 disables the cache
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 client = LandingAIADE(apikey=os.environ.get("VISION_AGENT_API_KEY"))
-text_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
+text_model = SentenceTransformer(EMBED_MODEL_NAME)
 @dataclass
 class Part:
     text: str
@@ -36,33 +68,52 @@ INLINE_NUM_CIT_RE = re.compile(
     r"\[\s*(?:\d+(?:\s*[-–]\s*\d+)?(?:\s*,\s*\d+)*)\s*\]"
 )
 _pc_client: Optional[Pinecone] = None
-_pinecone_index = None
-def bm25_to_state(texts: List[str]) -> Dict[str, Any]:
-    return {"texts": texts}
-def bm25_from_state(state: Dict[str, Any]) -> BM25Encoder:#fit with bm25 state(it is also text anyway) loaded from supabase
-    texts = state.get("texts") or []
-    if not texts:
-        raise RuntimeError("bm25_state has no texts.")
-    bm25 = BM25Encoder()
-    bm25.fit(texts)
-    return bm25
-def build_bm25_from_chunks(user_id: str, paper_id: int) -> BM25Encoder: #reffitng bm25 when user loads for history papers(fit with directly stored text in supabase)
-    chunks = get_chunks_for_paper(user_id, paper_id)
-    texts: List[str] = []
-    for c in chunks:
-        t = (c.get("text") or "").strip()
-        if t:
-            texts.append(t)
-    if texts:
-        bm25 = BM25Encoder()
-        bm25.fit(texts)
-        return bm25
+_index_backend: Optional[VectorBackend] = None
+ProgressCallback = Callable[[str, float], None] #(stage, fraction done) - lets the job queue track ingest stages
+_embed_cache: Optional[DiskCache] = None
+_parse_cache: Optional[ParseCache] = None
+_query_disk_cache = (
+    DiskCache(QUERY_CACHE_PATH, max_bytes=QUERY_CACHE_DISK_MB * 1024 * 1024) if QUERY_CACHE_DISK_MB > 0 else None
+)
+_retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+_paper_versions: Dict[Tuple[str, int], int] = {}
+_paper_versions_lock = threading.Lock()
+_dense_query_cache = TieredCache(
+    LRUCache(QUERY_CACHE_SIZE),
+    _query_disk_cache,
+    dumps=lambda v: json.dumps(v).encode("utf-8"),
+    loads=lambda raw: json.loads(raw),
+)
+_sparse_query_cache = TieredCache(
+    LRUCache(QUERY_CACHE_SIZE),
+    _query_disk_cache,
+    dumps=lambda v: json.dumps(v).encode("utf-8"),
+    loads=lambda raw: json.loads(raw),
+)
+def build_bm25_from_chunks(user_id: str, paper_id: int) -> BM25Encoder: #loading bm25 when user loads papers from history
     state = load_bm25_state(user_id, paper_id)
-    if state:
+    if state and state.get("version") == BM25_STATE_VERSION:
         return bm25_from_state(state)
-    raise RuntimeError(
-        "No text chunks or BM25 state found for this paper. Re-ingest required."
-    )
+    if is_legacy_bm25_state(state):
+        bm25 = bm25_from_state(state)
+    else: #no usable state, refit with directly stored text in supabase
+        chunks = get_chunks_for_paper(user_id, paper_id)
+        texts: List[str] = []
+        for c in chunks:
+            t = (c.get("text") or "").strip()
+            if t:
+                texts.append(t)
+        if not texts:
+            raise RuntimeError(
+                "No text chunks or BM25 state found for this paper. Re-ingest required."
+            )
+        bm25 = fit_bm25(texts)
+    try: #migrate the row so the next load skips refitting
+        save_bm25_state(user_id, paper_id, bm25_to_state(bm25))
+        logger.info(f"Migrated bm25_state for paper {paper_id} to v{BM25_STATE_VERSION}.")
+    except Exception as e:
+        logger.warning(f"Could not migrate bm25_state for paper {paper_id}: {e}")
+    return bm25
 def _get_pc() -> Pinecone:
     global _pc_client
     if _pc_client is None:
@@ -71,10 +122,11 @@ def _get_pc() -> Pinecone:
             raise RuntimeError("PINECONE_API_KEY not set.")
         _pc_client = Pinecone(api_key=api_key)
     return _pc_client
-def get_or_create_index():
-    global _pinecone_index
-    if _pinecone_index is not None:
-        return _pinecone_index
+def _create_index_backend() -> VectorBackend:
+    if VECTOR_BACKEND == "local":
+        return LocalBackend(LOCAL_INDEX_DIR, dimension=PINECONE_DIMENSION)
+    if VECTOR_BACKEND != "pinecone":
+        raise RuntimeError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}' (expected 'pinecone' or 'local').")
     pc = _get_pc()
     names = pc.list_indexes().names()
     if PINECONE_INDEX_NAME not in names:
@@ -84,44 +136,106 @@ def get_or_create_index():
             metric=PINECONE_METRIC,
             spec=ServerlessSpec(cloud="aws", region="us-east-1"),
         )
-    _pinecone_index = pc.Index(PINECONE_INDEX_NAME)
-    return _pinecone_index
+    return PineconeBackend(pc.Index(PINECONE_INDEX_NAME))
+def get_or_create_index() -> VectorBackend:
+    #connection only; readiness is checked by ensure_index_ready at startup and before each ingest, never per question
+    global _index_backend
+    if _index_backend is None:
+        _index_backend = _create_index_backend()
+    return _index_backend
+def ensure_index_ready(index: Optional[VectorBackend] = None) -> Optional[str]:
+    #None when the index answers, otherwise the error message so the caller can show it or abort
+    try:
+        (index or get_or_create_index()).describe_index_stats()
+    except Exception as e:
+        logger.error(f"Vector index readiness check failed: {e}")
+        return str(e)
+    return None
+def _no_progress(stage: str, fraction: float) -> None:
+    return None
+def _get_embed_cache() -> Optional[DiskCache]:
+    global _embed_cache
+    if _embed_cache is None and EMBED_CACHE_MAX_MB > 0:
+        _embed_cache = DiskCache(EMBED_CACHE_PATH, max_bytes=EMBED_CACHE_MAX_MB * 1024 * 1024)
+    return _embed_cache
+def encode_texts(texts: List[str], batch_size: int = 32) -> np.ndarray: #only the texts missing from the embedding cache go through the model
+    cache = _get_embed_cache()
+    if cache is None:
+        return np.asarray(text_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    keys = [content_key(EMBED_MODEL_NAME, normalize_text(t)) for t in texts]
+    cached = cache.get_many(keys)
+    vecs = np.zeros((len(texts), PINECONE_DIMENSION), dtype=np.float32)
+    missing: Dict[str, int] = {}
+    for i, k in enumerate(keys):
+        if k in cached:
+            vecs[i] = np.frombuffer(cached[k], dtype=np.float32)
+        elif k not in missing:
+            missing[k] = i
+    if missing:
+        fresh = text_model.encode(
+            [texts[i] for i in missing.values()], batch_size=batch_size
+        )
+        fresh = np.asarray(fresh, dtype=np.float32)
+        by_key = dict(zip(missing.keys(), fresh))
+        for i, k in enumerate(keys):
+            if k not in cached:
+                vecs[i] = by_key[k]
+        cache.set_many([(k, v.tobytes()) for k, v in by_key.items()])
+    logger.debug(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} encoded.")
+    return vecs
 def clean_text(text: str) -> str:
     text = INLINE_NUM_CIT_RE.sub("", text)
     text = re.sub(r"https?://\S+|www\.\S+", "", text)
     text = re.sub(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", "", text)
     return text.strip()
+def _get_parse_cache() -> ParseCache:
+    global _parse_cache
+    if _parse_cache is None:
+        disk = DiskCache(PARSE_CACHE_PATH, max_bytes=PARSE_CACHE_MAX_MB * 1024 * 1024) if PARSE_CACHE_MAX_MB > 0 else None
+        _parse_cache = ParseCache(disk, ADE_MODEL)
+    return _parse_cache
+def _ade_parse(**source) -> Tuple[List[Dict[str, Any]], Optional[str]]: #chunks and the model version ADE actually ran
+    retries = 3
+    response = None
+    for attempt in range(retries):
+        try:
+            response = client.parse(model=ADE_MODEL, **source)
+            break
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            logger.warning(f"Retrying ADE ({attempt+1}/{retries}): {e}")
+            time.sleep(5)
+    ade_json = json.loads(response.model_dump_json())
+    content_list = ade_json.get("chunks") or ade_json.get("content") or []
+    if not content_list:
+        raise ValueError("ADE returned 0 chunks (PDF may be scanned or invalid).")
+    return content_list, (ade_json.get("metadata") or {}).get("version")
+def _cached_ade_parse(kind: str, ident: str, **source) -> List[Dict[str, Any]]: #ADE is the slowest step of ingest, parse each document once per ADE model version
+    return _get_parse_cache().get_or_parse(kind, ident, lambda: _ade_parse(**source))
+def _parts_from_ade_chunks(content_list: List[Dict[str, Any]]) -> List[Part]:
+    parts = []
+    for item in content_list:
+        text = item.get("markdown") or item.get("text", "")
+        if not text.strip():
+            continue
+        parts.append(
+            Part(
+                text=clean_text(text),
+                page=item.get("grounding", {}).get("page", 1),
+                type=item.get("type", "text"),
+                caption=None,
+                extra=item.get("grounding", {}),
+            )
+        )
+    return parts
 def extract_parts_from_url(pdf_url: str) -> List[Part]:
     try:
-        retries = 3
-        response = None
-        for attempt in range(retries):
-            try:
-                response = client.parse(document_url=pdf_url, model="dpt-2-latest") #We pass the research paper's URL to ADE for extraction
-                break
-            except Exception as e:
-                if attempt == retries - 1:
-                    raise
-                logger.warning(f"Retrying ADE ({attempt+1}/{retries}): {e}")
-                time.sleep(5)
-        ade_json = json.loads(response.model_dump_json())
-        content_list = ade_json.get("chunks") or ade_json.get("content") or []
-        if not content_list:
-            raise ValueError("ADE returned 0 chunks (PDF may be scanned or invalid).")
-        parts = []
-        for item in content_list:
-            text = item.get("markdown") or item.get("text", "")
-            if not text.strip():
-                continue
-            parts.append(
-                Part(
-                    text=clean_text(text),
-                    page=item.get("grounding", {}).get("page", 1),
-                    type=item.get("type", "text"),
-                    caption=None,
-                    extra=item.get("grounding", {}),
-                )
-            )
+        content_list = _cached_ade_parse(
+            "url", pdf_url.strip(),
+            document_url=pdf_url, #We pass the research paper's URL to ADE for extraction
+        )
+        parts = _parts_from_ade_chunks(content_list)
         logger.info(f"ADE extracted {len(parts)} chunks.")
         return parts
     except Exception as e:
@@ -129,39 +243,11 @@ def extract_parts_from_url(pdf_url: str) -> List[Part]:
         raise
 def extract_parts_from_file(file_bytes: bytes) -> List[Part]:
     try:
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
-        retries = 3
-        response = None
-        for attempt in range(retries):
-            try:
-                response = client.parse(document=file_bytes, model="dpt-2-latest")
-                break
-            except Exception as e:
-                if attempt == retries - 1:
-                    raise
-                logger.warning(f"Retrying ADE ({attempt+1}/{retries}): {e}")
-                time.sleep(5)
-        os.unlink(tmp_path)
-        ade_json = json.loads(response.model_dump_json())
-        content_list = ade_json.get("chunks") or ade_json.get("content") or []
-        if not content_list:
-            raise ValueError("ADE returned 0 chunks (PDF may be scanned or invalid).")
-        parts = []
-        for item in content_list:
-            text = item.get("markdown") or item.get("text", "")
-            if not text.strip():
-                continue
-            parts.append(
-                Part(
-                    text=clean_text(text),
-                    page=item.get("grounding", {}).get("page", 1),
-                    type=item.get("type", "text"),
-                    caption=None,
-                    extra=item.get("grounding", {}),
-                )
-            )
+        content_list = _cached_ade_parse(
+            "sha256", hashlib.sha256(file_bytes).hexdigest(),
+            document=file_bytes,
+        )
+        parts = _parts_from_ade_chunks(content_list)
         logger.info(f"ADE extracted {len(parts)} chunks from uploaded file.")
         return parts
     except Exception as e:
@@ -173,37 +259,88 @@ def ingest_paper_from_file(
     namespace: str,
     paper_id: int,
     paper_title: str,
+    progress: Optional[ProgressCallback] = None,
 ) -> Dict[str, Any]:
-    index = get_or_create_index()
+    report = progress or _no_progress
+    report("parsing", 0.05)
     parts = extract_parts_from_file(file_bytes)
     parts = [p for p in parts if p.text.strip()]
     if not parts:
         raise RuntimeError("ADE could not extract any text from the uploaded PDF.")
+    result = _ingest_parts(parts, user_id, namespace, paper_id, paper_title, report)
+    logger.info(f"Ingested uploaded '{paper_title}' — {result['num_vectors']} vectors.")
+    return result
+def _to_sparse_dict(s: Dict[str, Any]) -> Dict[str, List]:
+    return {
+        "indices": s["indices"].tolist() if hasattr(s["indices"], "tolist") else s["indices"],
+        "values": s["values"].tolist() if hasattr(s["values"], "tolist") else s["values"]
+    }
+def _ingest_parts(
+    parts: List[Part],
+    user_id: str,
+    namespace: str,
+    paper_id: int,
+    paper_title: str,
+    report: ProgressCallback,
+) -> Dict[str, Any]:
+    #streaming ingest: embed batch -> sparse-encode batch -> store chunks + upsert batch, each stage on its own
+    #thread with bounded queues in between, so embedding of batch N overlaps the upsert of batch N-1
+    index = get_or_create_index()
+    error = ensure_index_ready(index)
+    if error:
+        raise RuntimeError(f"Vector index is not ready: {error}")
+    invalidate_paper_cache(namespace, paper_id)
     texts = [p.text for p in parts]
-    vecs = text_model.encode(texts, batch_size=32, show_progress_bar=True)
-    metas = create_meta(parts, user_id, paper_id, paper_title)
-    ids = [f"{paper_id}-{uuid.uuid4()}" for _ in range(len(vecs))]
-    save_paper_chunks(user_id, paper_id, metas)
-    docs = [Document(page_content=p.text, metadata={"page": p.page}) for p in parts]
-    bm25, sparse_vectors = sparse_fit_and_encode(docs)
-    state = bm25_to_state(texts)
-    save_bm25_state(user_id, paper_id, state)
-    hybrid_vectors = []
-    for i in range(len(vecs)):
-        s = sparse_vectors[i]
-        s = {
-            "indices": s["indices"].tolist() if hasattr(s["indices"], "tolist") else s["indices"],
-            "values": s["values"].tolist() if hasattr(s["values"], "tolist") else s["values"]
-        }
-        hybrid_vectors.append({
-            "id": ids[i],
-            "values": vecs[i].tolist(),
-            "sparse_values": s,
-            "metadata": metas[i],
-        })
-    index.upsert(vectors=hybrid_vectors, namespace=namespace)
-    logger.info(f"Ingested uploaded '{paper_title}' — {len(hybrid_vectors)} vectors.")
-    return {"parts": parts, "bm25": bm25, "num_vectors": len(hybrid_vectors)}
+    bm25 = fit_bm25(texts) #avgdl comes from the whole paper, so BM25 is fitted before any document is encoded
+    save_bm25_state(user_id, paper_id, bm25_to_state(bm25))
+    total = len(parts)
+    done = [0]
+    done_lock = threading.Lock()
+    def batch_done(n: int):
+        with done_lock:
+            done[0] += n
+            fraction = 0.3 + 0.7 * done[0] / total
+        report("indexing", fraction)
+    writer = BatchedUpserter(index, namespace, on_batch_done=batch_done)
+    report("embedding", 0.3)
+    def embed(batch: List[Part]):
+        return batch, encode_texts([p.text for p in batch], batch_size=32)
+    def sparse_encode(item):
+        batch, vecs = item
+        sparse_vectors = bm25.encode_documents([p.text for p in batch])
+        metas = create_meta(batch, user_id, paper_id, paper_title)
+        vectors, rows = [], []
+        for i in range(len(batch)):
+            vector_id = f"{paper_id}-{uuid.uuid4()}"
+            sparse = _to_sparse_dict(sparse_vectors[i])
+            vectors.append({"id": vector_id, "values": vecs[i].tolist(), "sparse_values": sparse, "metadata": metas[i]})
+            #the chunk row keeps its vectors so the index can be rebuilt without ADE or the model (reindex_paper)
+            rows.append(dict(
+                metas[i],
+                vector_id=vector_id,
+                embedding=encode_dense(vecs[i]),
+                sparse_embedding=encode_sparse(sparse),
+                embed_model=EMBED_MODEL_NAME,
+            ))
+        return rows, vectors
+    def upsert(item):
+        rows, vectors = item
+        save_paper_chunks(user_id, paper_id, rows)
+        writer.add(vectors)
+        return len(vectors)
+    batches = (parts[i: i + INGEST_BATCH_SIZE] for i in range(0, total, INGEST_BATCH_SIZE))
+    try:
+        run_stages(batches, [embed, sparse_encode, upsert], maxsize=INGEST_QUEUE_DEPTH)
+    except Exception:
+        writer.abort()
+        raise
+    upsert_stats = writer.close()
+    return {
+        "parts": parts,
+        "bm25": bm25,
+        "num_vectors": upsert_stats["vectors"],
+        "upsert_stats": upsert_stats,
+    }
 def create_meta(parts: List[Part], user_id: str, paper_id: int, paper_title: str):
     out = []
     for p in parts:
@@ -221,12 +358,65 @@ def create_meta(parts: List[Part], user_id: str, paper_id: int, paper_title: str
             "grounding": grounding_page if grounding_page else p.page,
         })
     return out
-def sparse_fit_and_encode(chunks: List[Document]):
-    texts = [c.page_content for c in chunks]
-    bm25 = BM25Encoder()
-    bm25.fit(texts)
-    sparse_vectors = bm25.encode_documents(texts)
-    return bm25, sparse_vectors
+def bm25_state_key(bm25: BM25Encoder) -> str:
+    #fingerprint of the fitted statistics, memoised on the encoder so it is computed once per loaded paper
+    key = getattr(bm25, "_state_key", None)
+    if key is None:
+        key = content_key("bm25", json.dumps(bm25.get_params(), sort_keys=True))
+        bm25._state_key = key
+    return key
+def encode_queries_dense(queries: List[str], dense_model) -> List[List[float]]: #cache misses go through the model in one encode call
+    if dense_model is not text_model: #only the ingest model has a stable name to key on
+        return [v.tolist() for v in dense_model.encode(queries)]
+    keys = [content_key("dense", EMBED_MODEL_NAME, normalize_text(q)) for q in queries]
+    vecs = [_dense_query_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        fresh = dense_model.encode([queries[i] for i in missing], batch_size=32)
+        for i, v in zip(missing, fresh):
+            vecs[i] = v.tolist()
+            _dense_query_cache.set(keys[i], vecs[i])
+    return vecs
+def encode_queries_sparse(queries: List[str], bm25: BM25Encoder) -> List[Dict[str, List]]:
+    state_key = bm25_state_key(bm25)
+    keys = [content_key("sparse", state_key, normalize_text(q)) for q in queries]
+    vecs = [_sparse_query_cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        fresh = bm25.encode_queries([queries[i] for i in missing])
+        for i, v in zip(missing, fresh):
+            vecs[i] = _to_sparse_dict(v)
+            _sparse_query_cache.set(keys[i], vecs[i])
+    return vecs
+def encode_query_dense(query: str, dense_model) -> List[float]:
+    return encode_queries_dense([query], dense_model)[0]
+def encode_query_sparse(query: str, bm25: BM25Encoder) -> Dict[str, List]:
+    return encode_queries_sparse([query], bm25)[0]
+def embed_queries(queries: List[str]) -> List[List[float]]: #the ingest model, through the same query cache
+    return encode_queries_dense(queries, text_model)
+def query_cache_stats() -> Dict[str, Any]:
+    return {
+        "dense": _dense_query_cache.stats(),
+        "sparse": _sparse_query_cache.stats(),
+        "retrieval": _retrieval_cache.stats(),
+    }
+def _paper_index_version(namespace: str, paper_id: int) -> int:
+    return _paper_versions.get((namespace, int(paper_id)), 0)
+def invalidate_paper_cache(namespace: str, paper_id: int) -> None:
+    #bumping the version orphans every cached context of the paper, the LRU ages them out
+    with _paper_versions_lock:
+        key = (namespace, int(paper_id))
+        _paper_versions[key] = _paper_versions.get(key, 0) + 1
+def retrieval_cache_key(namespace: str, paper_id: int, question: str, top_k: int, alpha: float, bm25: BM25Encoder):
+    return (
+        namespace,
+        int(paper_id),
+        normalize_text(question),
+        top_k,
+        round(alpha, 4),
+        _paper_index_version(namespace, paper_id),
+        bm25_state_key(bm25), #changes whenever the paper is re-ingested, also across processes
+    )
 def weight_by_alpha(sparse, dense, alpha: float):
     if not sparse or "indices" not in sparse or "values" not in sparse:
         sparse = {"indices": [], "values": []}
@@ -245,16 +435,19 @@ def query_ade_index(
     paper_id: int,
     top_k: int = 5,
     alpha: float = 0.6,
+    timings: Optional[Dict[str, float]] = None,
 ):
-    index = get_or_create_index()
-    try:
-        stats = index.describe_index_stats()
-    except Exception as e:
-        print("Error getting stats:", e)
+    #exactly one vector-store call per question, everything else is local work
     if bm25 is None:
         raise RuntimeError("No BM25 loaded for this paper. Missing bm25_state?")
-    q_dense = dense_model.encode([query])[0].tolist()
-    q_sparse = bm25.encode_queries([query])[0]
+    index = get_or_create_index()
+    with timed(timings, "embed_dense_ms"):
+        q_dense = encode_query_dense(query, dense_model)
+    with timed(timings, "embed_sparse_ms"):
+        q_sparse = encode_query_sparse(query, bm25)
+    with timed(timings, "vector_query_ms"):
+        return _hybrid_query(index, q_dense, q_sparse, namespace, paper_id, top_k, alpha)
+def _hybrid_query(index, q_dense, q_sparse, namespace: str, paper_id: int, top_k: int, alpha: float):
     sq, dq = weight_by_alpha(q_sparse, q_dense, alpha)
     if "indices" not in sq or "values" not in sq:
         sq = {"indices": [], "values": []}
@@ -278,7 +471,41 @@ def build_llm_context(
     bm25: BM25Encoder,
     top_k: int = 5,
     alpha: float = 0.6,
+    timings: Optional[Dict[str, float]] = None,
+    namespace: Optional[str] = None,
+    record_latency: bool = True,
 ) -> str:
+    #callers that already know the namespace (the UI keeps it in session state) skip the user lookup;
+    #record_latency=False leaves recording to the caller (route_and_retrieve records only the run it used)
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    if namespace is None:
+        with timed(timings, "user_lookup_ms"):
+            namespace = _namespace_for_user(user_id)
+    if bm25 is None:
+        raise RuntimeError("No BM25 loaded for this paper. Missing bm25_state?")
+    cache_key = retrieval_cache_key(namespace, paper_id, question, top_k, alpha, bm25)
+    context = _retrieval_cache.get(cache_key)
+    timings["retrieval_cache_hit"] = 1.0 if context is not None else 0.0
+    if context is None:
+        results = query_ade_index(
+            query=question,
+            bm25=bm25,
+            dense_model=text_model,
+            namespace=namespace,
+            paper_id=paper_id,
+            top_k=top_k,
+            alpha=alpha,
+            timings=timings,
+        )
+        with timed(timings, "format_ms"):
+            context = format_context(results, question, timings)
+        _retrieval_cache.set(cache_key, context)
+    timings["total_ms"] = (time.perf_counter() - started) * 1000.0
+    if record_latency:
+        record_query_latency(timings)
+    return context
+def _namespace_for_user(user_id: str) -> str:
     user = get_user_by_id(user_id)
     if isinstance(user, dict):
         namespace = user.get("namespace") #each user has a unique namespace and in each namespace we store multiple papers of the user with paper_id
@@ -286,22 +513,59 @@ def build_llm_context(
         namespace = getattr(user, "namespace", None)
     if not namespace:
         raise RuntimeError("User namespace not found for build_llm_context.")
-    results = query_ade_index(
-        query=question,
-        bm25=bm25,
-        dense_model=text_model,
-        namespace=namespace,
-        paper_id=paper_id,
-        top_k=top_k,
-        alpha=alpha,
-    )
+    return namespace
+def build_llm_context_batch(
+    user_id: str,
+    paper_id: int,
+    questions: List[str],
+    bm25: BM25Encoder,
+    top_k: int = 5,
+    alpha: float = 0.6,
+    max_workers: int = BATCH_QUERY_WORKERS,
+    timings: Optional[Dict[str, float]] = None,
+    namespace: Optional[str] = None,
+) -> List[str]:
+    #N questions = one namespace lookup + one dense encode call + one sparse encode call + parallel index queries
+    timings = {} if timings is None else timings
+    if not questions:
+        return []
+    if bm25 is None:
+        raise RuntimeError("No BM25 loaded for this paper. Missing bm25_state?")
+    started = time.perf_counter()
+    if namespace is None:
+        with timed(timings, "user_lookup_ms"):
+            namespace = _namespace_for_user(user_id)
+    keys = [retrieval_cache_key(namespace, paper_id, q, top_k, alpha, bm25) for q in questions]
+    contexts: List[Optional[str]] = [_retrieval_cache.get(k) for k in keys]
+    missing = [i for i, c in enumerate(contexts) if c is None]
+    timings["retrieval_cache_hits"] = float(len(questions) - len(missing))
+    if missing:
+        index = get_or_create_index()
+        miss_questions = [questions[i] for i in missing]
+        with timed(timings, "embed_dense_ms"):
+            dense = encode_queries_dense(miss_questions, text_model)
+        with timed(timings, "embed_sparse_ms"):
+            sparse = encode_queries_sparse(miss_questions, bm25)
+        def run(j: int) -> str:
+            results = _hybrid_query(index, dense[j], sparse[j], namespace, paper_id, top_k, alpha)
+            return format_context(results, miss_questions[j])
+        with timed(timings, "vector_query_ms"):
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+                fresh = list(pool.map(run, range(len(missing))))
+        for i, context in zip(missing, fresh):
+            contexts[i] = context
+            _retrieval_cache.set(keys[i], context)
+    timings["total_ms"] = (time.perf_counter() - started) * 1000.0
+    timings["questions"] = float(len(questions))
+    return contexts
+def format_context(results, question: str = "", timings: Optional[Dict[str, float]] = None) -> str:
     if hasattr(results, "to_dict"):
         data = results.to_dict()
     elif isinstance(results, dict):
         data = results
     else:
         data = {"matches": getattr(results, "matches", [])}
-    lines = []
+    snippets = []
     for m in data.get("matches", []):
         if isinstance(m, dict):
             meta = m.get("metadata", {}) or {}
@@ -312,10 +576,16 @@ def build_llm_context(
         snippet = (meta.get("text") or "").strip()
         if not snippet:
             continue
-        lines.append(
-            f"[Page {meta.get('page')} | {meta.get('type')}]\n"
-            f"{snippet}\n"
-            f"(Score: {score:.3f})\n"
+        snippets.append(Snippet(text=snippet, page=meta.get("page"), type=meta.get("type"), score=score))
+    lines, stats = assemble_context(snippets, question)
+    if timings is not None:
+        timings["context_tokens"] = float(stats.output_tokens)
+        timings["context_tokens_saved"] = float(stats.tokens_saved)
+    if stats.tokens_saved:
+        logger.info(
+            f"Context: {stats.output_tokens} tokens, saved {stats.tokens_saved} "
+            f"({stats.dropped_duplicates} duplicates, {stats.truncated_tables} tables cut, "
+            f"{stats.dropped_over_budget} over budget)."
         )
     if not lines:
         return PRIMER + "No relevant context found for this question."
@@ -326,45 +596,137 @@ def ingest_paper_for_user(
     namespace: str,
     paper_id: int,
     paper_title: str,
+    progress: Optional[ProgressCallback] = None,
 ) -> Dict[str, Any]:
-    index = get_or_create_index()
+    report = progress or _no_progress
+    report("parsing", 0.05)
     parts = extract_parts_from_url(pdf_url)
     parts = [p for p in parts if p.text.strip()]
     if not parts:
         raise RuntimeError(
             "ADE is not able to extract any text from the provided PDF."
         )
-    texts = [p.text for p in parts]
-    vecs = text_model.encode(texts, batch_size=32, show_progress_bar=True)
-    metas = create_meta(parts, user_id, paper_id, paper_title)
-    ids = [f"{paper_id}-{uuid.uuid4()}" for _ in range(len(vecs))]
-    save_paper_chunks(user_id, paper_id, metas)
-    docs = [Document(page_content=p.text, metadata={"page": p.page}) for p in parts]
-    bm25, sparse_vectors = sparse_fit_and_encode(docs)
-    state = bm25_to_state(texts)
-    save_bm25_state(user_id, paper_id, state)
-    hybrid_vectors = []
-    for i in range(len(vecs)):
-        s = sparse_vectors[i]
-        s = {
-            "indices": s["indices"].tolist() if hasattr(s["indices"], "tolist") else s["indices"],
-            "values": s["values"].tolist() if hasattr(s["values"], "tolist") else s["values"]
-        }
-        hybrid_vectors.append(
-            {
-                "id": ids[i],
-                "values": vecs[i].tolist(),
-                "sparse_values": s,
-                "metadata": metas[i],
-            }
-        )
-    index.upsert(vectors=hybrid_vectors, namespace=namespace)
+    result = _ingest_parts(parts, user_id, namespace, paper_id, paper_title, report)
     logger.info(
-        f"Ingested '{paper_title}' — {len(hybrid_vectors)} vectors stored "
+        f"Ingested '{paper_title}' — {result['num_vectors']} vectors stored "
         f"under namespace '{namespace}'."
     )
+    return result
+def _stored_meta(row: Dict[str, Any], user_id: str, paper_id: int, paper_title: str) -> Dict[str, Any]:
+    #same fields create_meta writes at ingest time, rebuilt from the stored chunk row
     return {
-        "parts": parts,
-        "bm25": bm25,
-        "num_vectors": len(hybrid_vectors),
-    }
\ No newline at end of file
+        "user_id": user_id,
+        "paper_id": float(paper_id),
+        "paper_title": paper_title,
+        "page": row.get("page"),
+        "type": row.get("type"),
+        "caption": row.get("caption") or "",
+        "text": row.get("text") or "",
+        "grounding": row.get("grounding"),
+    }
+def _paper_title(user_id: str, paper_id: int) -> str:
+    for p in list_papers_for_user(user_id):
+        if p.get("id") == paper_id:
+            return p.get("title") or ""
+    raise RuntimeError(f"Paper {paper_id} not found for this user.")
+def _stored_chunk_pages(user_id: str, paper_id: int) -> Any:
+    cursor = None
+    while True:
+        rows, cursor = get_chunk_vectors_page(user_id, paper_id, after_id=cursor, limit=REINDEX_PAGE_SIZE)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+def reindex_paper(
+    user_id: str,
+    namespace: str,
+    paper_id: int,
+    index: Optional[VectorBackend] = None,
+    paper_title: Optional[str] = None,
+    replace: bool = False,
+) -> Dict[str, Any]:
+    #rebuilds a paper's vectors in any backend from paper_chunks alone: stored rows are decoded and bulk-upserted
+    #with the ids they were ingested under, so reindexing into the same index overwrites instead of duplicating.
+    #rows without stored vectors (ingested before migrations/004, or by another embed model) are re-encoded
+    #from their text; replace=True deletes the paper's existing vectors first
+    index = index or get_or_create_index()
+    title = paper_title if paper_title is not None else _paper_title(user_id, paper_id)
+    if replace:
+        index.delete_paper(namespace, paper_id)
+    invalidate_paper_cache(namespace, paper_id)
+    bm25: List[Optional[BM25Encoder]] = [None] #fitted lazily, only legacy rows need it
+    reencoded = [0]
+    def decode(rows: List[Dict[str, Any]]):
+        dense: List[Optional[np.ndarray]] = [None] * len(rows)
+        sparse: List[Optional[Dict[str, List]]] = [None] * len(rows)
+        stale_dense: List[int] = []
+        stale_sparse: List[int] = []
+        for i, row in enumerate(rows):
+            if row.get("embedding") and row.get("embed_model") == EMBED_MODEL_NAME:
+                dense[i] = decode_dense(row["embedding"], PINECONE_DIMENSION)
+            else:
+                stale_dense.append(i)
+            sparse[i] = decode_sparse(row.get("sparse_embedding"))
+            if sparse[i] is None:
+                stale_sparse.append(i)
+        if stale_dense:
+            fresh = encode_texts([rows[i].get("text") or "" for i in stale_dense])
+            for i, vec in zip(stale_dense, fresh):
+                dense[i] = vec
+        if stale_sparse:
+            if bm25[0] is None:
+                bm25[0] = build_bm25_from_chunks(user_id, paper_id)
+            fresh = bm25[0].encode_documents([rows[i].get("text") or "" for i in stale_sparse])
+            for i, vec in zip(stale_sparse, fresh):
+                sparse[i] = _to_sparse_dict(vec)
+        reencoded[0] += len(set(stale_dense) | set(stale_sparse))
+        return [
+            {
+                #legacy rows get a stable id derived from the row, still prefixed by paper_id for delete_paper
+                "id": row.get("vector_id") or f"{paper_id}-chunk-{row['id']}",
+                "values": dense[i].tolist(),
+                "sparse_values": sparse[i],
+                "metadata": _stored_meta(row, user_id, paper_id, title),
+            }
+            for i, row in enumerate(rows)
+        ]
+    writer = BatchedUpserter(index, namespace)
+    def upsert(vectors: List[Dict[str, Any]]) -> int:
+        writer.add(vectors)
+        return len(vectors)
+    try:
+        run_stages(_stored_chunk_pages(user_id, paper_id), [decode, upsert], maxsize=INGEST_QUEUE_DEPTH)
+    except Exception:
+        writer.abort()
+        raise
+    upsert_stats = writer.close()
+    invalidate_paper_cache(namespace, paper_id)
+    logger.info(
+        f"Reindexed paper {paper_id} into namespace '{namespace}': {upsert_stats['vectors']} vectors, "
+        f"{reencoded[0]} re-encoded from text."
+    )
+    return {"num_vectors": upsert_stats["vectors"], "reencoded": reencoded[0], "upsert_stats": upsert_stats}
+def reindex_user(
+    user_id: str,
+    index: Optional[VectorBackend] = None,
+    replace: bool = False,
+) -> Dict[int, Dict[str, Any]]:
+    #every ready paper of one user, e.g. after switching VECTOR_BACKEND or losing the Pinecone index
+    namespace = _namespace_for_user(user_id)
+    index = index or get_or_create_index()
+    out: Dict[int, Dict[str, Any]] = {}
+    for p in list_papers_for_user(user_id):
+        if p.get("status") not in READY_STATUSES:
+            continue
+        out[p["id"]] = reindex_paper(user_id, namespace, p["id"], index=index, paper_title=p.get("title") or "", replace=replace)
+    return out
+def delete_paper_for_user(user_id: str, namespace: str, paper_id: int) -> int:
+    #an ingest still running would upsert its remaining batches after the delete and leave orphan vectors behind
+    if list_ingest_jobs_for_paper(user_id, paper_id, ACTIVE_STATUSES):
+        raise RuntimeError("This paper is still being ingested; delete it once the job has finished or failed.")
+    index = get_or_create_index()
+    deleted = index.delete_paper(namespace, paper_id)
+    delete_paper(user_id, paper_id)
+    invalidate_paper_cache(namespace, paper_id)
+    logger.info(f"Deleted paper {paper_id} ({deleted} vectors) from namespace '{namespace}'.")
+    return deleted
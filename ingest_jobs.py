@@ -0,0 +1,123 @@
+#background ingestion: jobs run in a local process pool and report their stage to the ingest_jobs / papers tables
+from __future__ import annotations
+import os
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Optional
+from supabase_client import create_ingest_job, update_ingest_job, update_paper_status, list_stale_ingest_jobs
+logger = logging.getLogger(__name__)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_STALE_SECONDS = float(os.getenv("INGEST_STALE_SECONDS", "1800")) #active jobs not updated for this long are orphaned
+ACTIVE_STATUSES = ("queued", "parsing", "embedding", "indexing")
+_executor: Optional[ProcessPoolExecutor] = None
+_futures: Dict[int, Future] = {}
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        #spawn instead of fork: the web process already holds torch/grpc state that must not be forked
+        _executor = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+def _set_stage(job_id: int, user_id: str, paper_id: int, status: str, progress: float, **extra: Any) -> None:
+    update_ingest_job(job_id, status=status, progress=progress, **extra)
+    update_paper_status(user_id, paper_id, status)
+def _run_ingest_job(
+    job_id: int,
+    source_kind: str,
+    source: Any,
+    user_id: str,
+    namespace: str,
+    paper_id: int,
+    paper_title: str,
+) -> Dict[str, Any]:
+    #runs inside a worker process, the embedding model is loaded once per worker on first import
+    from hybrid_partition_ingest import ingest_paper_for_user, ingest_paper_from_file
+    last = {"status": None, "percent": None}
+    lock = threading.Lock() #called from the ingest stage threads and the upsert pool
+    def progress(stage: str, fraction: float) -> None:
+        #embedding batches report far more often than the UI can show, write only visible changes
+        percent = int(fraction * 100)
+        with lock:
+            if stage == last["status"] and percent == last["percent"]:
+                return
+            update_ingest_job(job_id, status=stage, progress=fraction)
+            if stage != last["status"]:
+                update_paper_status(user_id, paper_id, stage)
+            last.update(status=stage, percent=percent)
+    try:
+        if source_kind == "url":
+            result = ingest_paper_for_user(
+                pdf_url=source,
+                user_id=user_id,
+                namespace=namespace,
+                paper_id=paper_id,
+                paper_title=paper_title,
+                progress=progress,
+            )
+        else:
+            result = ingest_paper_from_file(
+                file_bytes=source,
+                user_id=user_id,
+                namespace=namespace,
+                paper_id=paper_id,
+                paper_title=paper_title,
+                progress=progress,
+            )
+    except Exception as e:
+        logger.error(f"Ingest job {job_id} failed: {e}")
+        _set_stage(job_id, user_id, paper_id, "failed", 1.0, error=str(e)[:2000])
+        return {"job_id": job_id, "status": "failed", "error": str(e)}
+    _set_stage(job_id, user_id, paper_id, "ready", 1.0, num_vectors=result["num_vectors"])
+    return {"job_id": job_id, "status": "ready", "num_vectors": result["num_vectors"]}
+def _submit(job: Dict[str, Any], source_kind: str, source: Any, user_id: str, namespace: str,
+            paper_id: int, paper_title: str) -> Dict[str, Any]:
+    global _executor
+    args = (job["id"], source_kind, source, user_id, namespace, paper_id, paper_title)
+    try:
+        try:
+            future = _get_executor().submit(_run_ingest_job, *args)
+        except RuntimeError: #BrokenProcessPool (a worker died) or pool shut down, start a fresh one
+            _executor = None
+            future = _get_executor().submit(_run_ingest_job, *args)
+    except Exception as e:
+        _set_stage(job["id"], user_id, paper_id, "failed", 1.0, error=f"Could not start ingest: {e}"[:2000])
+        raise
+    _futures[job["id"]] = future
+    def on_done(f: Future, job_id=job["id"]) -> None:
+        _futures.pop(job_id, None)
+        if not f.cancelled() and f.exception() is not None: #the worker process itself died
+            try:
+                _set_stage(job_id, user_id, paper_id, "failed", 1.0, error=str(f.exception())[:2000])
+            except Exception as e:
+                logger.error(f"Could not mark ingest job {job_id} failed: {e}")
+    future.add_done_callback(on_done)
+    return job
+def submit_url_ingest(user_id: str, namespace: str, paper_id: int, paper_title: str, pdf_url: str) -> Dict[str, Any]:
+    job = create_ingest_job(user_id, paper_id, "url", pdf_url)
+    return _submit(job, "url", pdf_url, user_id, namespace, paper_id, paper_title)
+def submit_file_ingest(user_id: str, namespace: str, paper_id: int, paper_title: str,
+                       file_bytes: bytes, file_name: str) -> Dict[str, Any]:
+    job = create_ingest_job(user_id, paper_id, "file", file_name)
+    return _submit(job, "file", file_bytes, user_id, namespace, paper_id, paper_title)
+def recover_stale_jobs() -> int:
+    #jobs left active by a crashed or restarted pool would otherwise show as in progress forever; the bytes of an
+    #upload are gone with the pool, so they are failed rather than requeued and the paper can be deleted and re-added
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=INGEST_STALE_SECONDS)).isoformat()
+    recovered = 0
+    for job in list_stale_ingest_jobs(ACTIVE_STATUSES, cutoff):
+        if job["id"] in _futures: #still running in this process, just slow
+            continue
+        try:
+            _set_stage(job["id"], job["user_id"], job["paper_id"], "failed", 1.0,
+                       error="Ingest was interrupted before it finished. Delete the paper and add it again.")
+            recovered += 1
+        except Exception as e:
+            logger.error(f"Could not mark stale ingest job {job['id']} failed: {e}")
+    if recovered:
+        logger.warning(f"Marked {recovered} stale ingest job(s) failed.")
+    return recovered
@@ -0,0 +1,70 @@
+#tiny threaded stage runner used by ingest: each stage runs in its own thread and hands items on through a bounded queue
+from __future__ import annotations
+import queue
+import threading
+from typing import Any, Callable, Iterable, List
+_DONE = object()
+def run_stages(
+    source: Iterable[Any],
+    stages: List[Callable[[Any], Any]],
+    maxsize: int = 2,
+) -> List[Any]:
+    #stage N works on batch k while stage N+1 works on batch k-1; maxsize caps how many batches wait between
+    #two stages, so memory stays flat however long the source is. Returns the last stage's outputs in order.
+    if not stages:
+        return list(source)
+    queues = [queue.Queue(maxsize=maxsize) for _ in stages]
+    results: List[Any] = []
+    errors: List[BaseException] = []
+    stop = threading.Event()
+    def put(q: queue.Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    def worker(i: int, fn: Callable[[Any], Any]) -> None:
+        inq = queues[i]
+        outq = queues[i + 1] if i + 1 < len(stages) else None
+        while True:
+            try:
+                item = inq.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                if outq is not None:
+                    put(outq, _DONE)
+                return
+            try:
+                out = fn(item)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+                return
+            if outq is None:
+                results.append(out)
+            elif not put(outq, out):
+                return
+    threads = [
+        threading.Thread(target=worker, args=(i, fn), daemon=True, name=f"ingest-stage-{i}")
+        for i, fn in enumerate(stages)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for item in source:
+            if not put(queues[0], item):
+                break
+        put(queues[0], _DONE)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
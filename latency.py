@@ -0,0 +1,46 @@
+#per-stage latency breakdown for the query path, plus a rolling window so regressions show up in p50/p95
+from __future__ import annotations
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+_history: Deque[Dict[str, float]] = deque(maxlen=LATENCY_WINDOW)
+_lock = threading.Lock()
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000.0 #milliseconds
+def record_query_latency(timings: Dict[str, float]) -> None:
+    #only *_ms entries are latencies, the same dict also carries counters like cache hits or token counts
+    with _lock:
+        _history.append({k: v for k, v in timings.items() if k.endswith("_ms")})
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+def latency_summary() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        history = list(_history)
+    stages = sorted({k for t in history for k in t})
+    out = {}
+    for stage in stages:
+        values = [t[stage] for t in history if stage in t]
+        out[stage] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "max_ms": round(max(values), 2),
+        }
+    return out
+def reset_latency_history() -> None:
+    with _lock:
+        _history.clear()
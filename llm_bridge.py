@@ -1,8 +1,9 @@
 from __future__ import annotations
 import os
-from groq import Groq
-import requests
-from typing import List, Optional, Union
+import json
+from http_client import get_session, timeout
+from llm_clients import async_llm_slot, get_async_groq_client, get_async_http_client, get_groq_client, llm_slot
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
 INSTRUCTIONS = (
@@ -26,13 +27,8 @@ def _clean_text(text: Optional[str]) -> str:
         return ""
     return " ".join(text.split()).strip()
 #I am just defining both claude and llama answer functions here just incase if i end up with out of credits in either service. You can use either of them based on your preference. But make sure you replace the existing calls in other files(frontend.py) accordingly.
-def answer_with_claude(
-    context_text: str,
-    question: str,
-    model: str = "claude-3-haiku-20240307",
-    max_tokens: int = 1024
-) -> str:
-    payload = {
+def _claude_payload(context_text: str, question: str, model: str, max_tokens: int) -> Dict[str, Any]:
+    return {
         "model": model,
         "max_tokens": max_tokens,
         "system": INSTRUCTIONS,
@@ -46,21 +42,71 @@ def answer_with_claude(
             }
         ]
     }
+def _claude_headers() -> Dict[str, str]:
+    return {
+        "x-api-key": CLAUDE_API_KEY,
+        "anthropic-version": "2023-06-01",
+        "content-type": "application/json",
+    }
+def _llama_messages(context_text: str, question: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": INSTRUCTIONS},
+        {
+            "role": "user",
+            "content": (
+                f"CONTEXT:\n{context_text}\n\n"
+                f"QUESTION:\n{question}"
+            )
+        }
+    ]
+def iter_sse_events(resp) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    #server-sent events from a streamed requests response -> (event name, parsed data)
+    event, data_lines = "message", []
+    for raw in resp.iter_lines(decode_unicode=True):
+        if raw is None:
+            continue
+        line = raw.rstrip("\r")
+        if not line:
+            if data_lines:
+                data = "\n".join(data_lines)
+                try:
+                    yield event, json.loads(data)
+                except ValueError:
+                    pass
+            event, data_lines = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+    if data_lines:
+        try:
+            yield event, json.loads("\n".join(data_lines))
+        except ValueError:
+            pass
+def answer_with_claude(
+    context_text: str,
+    question: str,
+    model: str = "claude-3-haiku-20240307",
+    max_tokens: int = 1024
+) -> str:
+    payload = _claude_payload(context_text, question, model, max_tokens)
     try:
-        resp = requests.post(
-            CLAUDE_API_URL,
-            headers={
-                "x-api-key": CLAUDE_API_KEY,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json",
-            },
-            json=payload,
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        with llm_slot("anthropic"):
+            resp = get_session().post(
+                CLAUDE_API_URL,
+                headers=_claude_headers(),
+                json=payload,
+                timeout=timeout(30),
+            )
+            resp.raise_for_status()
+            data = resp.json()
     except Exception as e:
         return f"[Claude error] {e}"
+    return _claude_text(data)
+def _claude_text(data: Dict[str, Any]) -> str:
     parts = []
     for block in data.get("content", []):
         if block.get("type") == "text":
@@ -68,38 +114,65 @@ def answer_with_claude(
             if txt:
                 parts.append(txt)
     return "\n".join(parts) if parts else "No clear answer found."
+def stream_with_claude(
+    context_text: str,
+    question: str,
+    model: str = "claude-3-haiku-20240307",
+    max_tokens: int = 1024
+) -> Iterator[str]:
+    #same contract as answer_with_claude but yields text deltas as they arrive (SSE), errors are yielded as text
+    payload = _claude_payload(context_text, question, model, max_tokens)
+    payload["stream"] = True
+    produced = False
+    try:
+        with llm_slot("anthropic"), get_session().post(
+            CLAUDE_API_URL,
+            headers=_claude_headers(),
+            json=payload,
+            timeout=timeout(30),
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            for _, data in iter_sse_events(resp):
+                kind = data.get("type")
+                if kind == "content_block_delta" and data.get("delta", {}).get("type") == "text_delta":
+                    text = data["delta"].get("text", "")
+                    if text:
+                        produced = True
+                        yield text
+                elif kind == "error":
+                    yield f"[Claude error] {data.get('error', {}).get('message', 'stream error')}"
+                    return
+    except Exception as e:
+        yield f"[Claude error] {e}"
+        return
+    if not produced:
+        yield "No clear answer found."
 def answer_with_llama(
     context_text: str,
     question: str,
     model: str = "llama-3.1-8b-instant",
     max_tokens: int = 1024
 ) -> str:
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    if not os.getenv("GROQ_API_KEY"):
         raise RuntimeError("GROQ_API_KEY is not set.")
     try:
-        client = Groq(api_key=api_key)
+        client = get_groq_client()
     except Exception as e:
         return f"[Groq init error] {e}"
-    messages = [
-        {"role": "system", "content": INSTRUCTIONS},
-        {
-            "role": "user",
-            "content": (
-                f"CONTEXT:\n{context_text}\n\n"
-                f"QUESTION:\n{question}"
-            )
-        }
-    ]
+    messages = _llama_messages(context_text, question)
     try:
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=model,
-            max_tokens=max_tokens,
-            temperature=0.0,
-        )
+        with llm_slot("groq"):
+            chat_completion = client.chat.completions.create(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.0,
+            )
     except Exception as e:
         return f"[Groq API error] {e}"
+    return _llama_answer(chat_completion)
+def _llama_answer(chat_completion) -> str:
     if (
         not chat_completion or
         not chat_completion.choices or
@@ -108,4 +181,66 @@ def answer_with_llama(
         return "No response from LLaMA."
     raw = chat_completion.choices[0].message.content
     text = _extract_llama_text(raw)
-    return _clean_text(text)
\ No newline at end of file
+    return _clean_text(text)
+def stream_with_llama(
+    context_text: str,
+    question: str,
+    model: str = "llama-3.1-8b-instant",
+    max_tokens: int = 1024
+) -> Iterator[str]:
+    client = get_groq_client()
+    produced = False
+    try:
+        with llm_slot("groq"):
+            stream = client.chat.completions.create(
+                messages=_llama_messages(context_text, question),
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.0,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    produced = True
+                    yield delta
+    except Exception as e:
+        yield f"[Groq API error] {e}"
+        return
+    if not produced:
+        yield "No response from LLaMA."
+async def answer_with_claude_async(
+    context_text: str,
+    question: str,
+    model: str = "claude-3-haiku-20240307",
+    max_tokens: int = 1024
+) -> str:
+    payload = _claude_payload(context_text, question, model, max_tokens)
+    try:
+        async with async_llm_slot("anthropic"):
+            resp = await get_async_http_client().post(CLAUDE_API_URL, headers=_claude_headers(), json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+    except Exception as e:
+        return f"[Claude error] {e}"
+    return _claude_text(data)
+async def answer_with_llama_async(
+    context_text: str,
+    question: str,
+    model: str = "llama-3.1-8b-instant",
+    max_tokens: int = 1024
+) -> str:
+    client = get_async_groq_client()
+    try:
+        async with async_llm_slot("groq"):
+            chat_completion = await client.chat.completions.create(
+                messages=_llama_messages(context_text, question),
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.0,
+            )
+    except Exception as e:
+        return f"[Groq API error] {e}"
+    return _llama_answer(chat_completion)
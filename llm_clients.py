@@ -0,0 +1,81 @@
+#process-wide LLM clients: one lazily built Groq client (sync + async) and shared Anthropic transports, each behind
+#a concurrency limit so bursts of rewrite/answer calls queue locally instead of tripping provider rate limits
+from __future__ import annotations
+import os
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+import httpx
+from groq import AsyncGroq, Groq
+from http_client import HTTP_CONNECT_TIMEOUT, HTTP_POOL_MAXSIZE
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+ANTHROPIC_MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "8"))
+_lock = threading.Lock()
+_groq: Optional[Groq] = None
+_groq_key: Optional[str] = None
+_slots = {
+    "groq": threading.BoundedSemaphore(GROQ_MAX_CONCURRENCY),
+    "anthropic": threading.BoundedSemaphore(ANTHROPIC_MAX_CONCURRENCY),
+}
+_limits = {"groq": GROQ_MAX_CONCURRENCY, "anthropic": ANTHROPIC_MAX_CONCURRENCY}
+#async clients and semaphores belong to the event loop that created them, so they are cached per loop
+_async_groq: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGroq]" = weakref.WeakKeyDictionary()
+_async_http: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+def _groq_api_key() -> str:
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise RuntimeError("GROQ_API_KEY is not set.")
+    return api_key
+def get_groq_client() -> Groq:
+    global _groq, _groq_key
+    api_key = _groq_api_key()
+    if _groq is None or _groq_key != api_key:
+        with _lock:
+            if _groq is None or _groq_key != api_key:
+                _groq = Groq(api_key=api_key)
+                _groq_key = api_key
+    return _groq
+def get_async_groq_client() -> AsyncGroq:
+    loop = asyncio.get_running_loop()
+    client = _async_groq.get(loop)
+    if client is None:
+        client = AsyncGroq(api_key=_groq_api_key())
+        _async_groq[loop] = client
+    return client
+def get_async_http_client() -> httpx.AsyncClient:
+    #async counterpart of http_client.get_session() for the Anthropic endpoint
+    loop = asyncio.get_running_loop()
+    client = _async_http.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+            timeout=httpx.Timeout(30.0, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        _async_http[loop] = client
+    return client
+@contextmanager
+def llm_slot(provider: str) -> Iterator[None]:
+    sem = _slots[provider]
+    sem.acquire()
+    try:
+        yield
+    finally:
+        sem.release()
+@asynccontextmanager
+async def async_llm_slot(provider: str) -> AsyncIterator[None]:
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = {name: asyncio.Semaphore(limit) for name, limit in _limits.items()}
+        _async_slots[loop] = slots
+    async with slots[provider]:
+        yield
+def reset_clients() -> None:
+    global _groq, _groq_key
+    with _lock:
+        if _groq is not None:
+            _groq.close()
+        _groq, _groq_key = None, None
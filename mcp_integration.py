@@ -1,5 +1,6 @@
 import os
 import requests
+from http_client import get_session, timeout
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 SERPAPI_API_KEY = os.environ.get("SERPAPI_API_KEY", "")
@@ -35,10 +36,10 @@ class WebSearchClient:
             "gl": "us",
         }
         try:
-            response = requests.get(
+            response = get_session().get(
                 self.endpoint,
                 params=params,
-                timeout=self.timeout,
+                timeout=timeout(self.timeout),
             )
             response.raise_for_status()
             data = response.json()
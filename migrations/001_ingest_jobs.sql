@@ -0,0 +1,20 @@
+-- Background ingestion queue: job table + papers.status lifecycle
+-- papers.status moves through queued -> parsing -> embedding -> indexing -> ready | failed
+
+ALTER TABLE papers ALTER COLUMN status SET DEFAULT 'queued';
+
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    paper_id INTEGER REFERENCES papers(id) ON DELETE CASCADE,
+    source_kind TEXT NOT NULL,          -- 'url' or 'file'
+    source TEXT NOT NULL,               -- pdf url or uploaded file name
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    num_vectors INTEGER,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user_id ON ingest_jobs(user_id);
@@ -0,0 +1,6 @@
+-- Durable storage for rendered diagrams
+-- paper_chats.svg_path holds the object name inside this bucket (<sha256 of d2 source/version/theme>.svg)
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('diagrams', 'diagrams', false)
+ON CONFLICT (id) DO NOTHING;
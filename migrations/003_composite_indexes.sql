@@ -0,0 +1,19 @@
+-- Composite indexes matched to the hot queries in supabase_client.py
+--   get_chunks_for_paper / paper_chunks:     WHERE paper_id = ? AND user_id = ? ORDER BY id
+--   get_chat_history_page / paper_chats:     WHERE paper_id = ? AND user_id = ? [AND id < ?] ORDER BY id DESC LIMIT n
+--   get_chat_history / paper_chats:          WHERE paper_id = ? AND user_id = ? ORDER BY created_at LIMIT n
+--   list_papers_for_user / papers:           WHERE user_id = ? ORDER BY created_at DESC (covering, index-only scans)
+--   load_bm25_state / papers:                WHERE id = ? AND user_id = ?  -> primary key, nothing to add
+-- paper_id leads so ON DELETE CASCADE from papers still finds child rows through these indexes, which makes
+-- the old single-column indexes redundant.
+-- On a busy database run each CREATE with CONCURRENTLY outside a transaction instead.
+
+CREATE INDEX IF NOT EXISTS idx_chunks_paper_user_id ON paper_chunks(paper_id, user_id, id);
+CREATE INDEX IF NOT EXISTS idx_chats_paper_user_id ON paper_chats(paper_id, user_id, id);
+CREATE INDEX IF NOT EXISTS idx_chats_paper_user_created ON paper_chats(paper_id, user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_papers_user_created ON papers(user_id, created_at DESC)
+    INCLUDE (id, title, pdf_url, status);
+
+DROP INDEX IF EXISTS idx_chunks_paper_id;
+DROP INDEX IF EXISTS idx_chats_paper_id;
+DROP INDEX IF EXISTS idx_papers_user_id;
@@ -0,0 +1,11 @@
+-- Vectors stored next to their chunks so a vector index can be rebuilt from Postgres alone
+--   vector_id:        id the vector was upserted under (<paper_id>-<uuid>), reused on reindex so it overwrites
+--   embedding:        dense vector, base64 of little-endian float16 (see vector_codec.py)
+--   sparse_embedding: BM25 vector, {"indices": [...], "values": [...]}
+--   embed_model:      model that produced embedding; rows from another model are re-encoded on reindex
+-- Rows ingested before this migration keep NULLs and fall back to re-encoding their stored text.
+
+ALTER TABLE paper_chunks ADD COLUMN IF NOT EXISTS vector_id TEXT;
+ALTER TABLE paper_chunks ADD COLUMN IF NOT EXISTS embedding TEXT;
+ALTER TABLE paper_chunks ADD COLUMN IF NOT EXISTS sparse_embedding JSONB;
+ALTER TABLE paper_chunks ADD COLUMN IF NOT EXISTS embed_model TEXT;
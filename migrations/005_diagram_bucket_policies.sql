@@ -0,0 +1,18 @@
+-- Storage policies for the diagrams bucket created in 002_diagram_bucket.sql
+-- The app authenticates users itself and talks to Supabase with the anon key, and Storage denies every request
+-- on a private bucket unless a policy on storage.objects allows it. These policies are scoped to the diagrams
+-- bucket only and grant read and create, nothing else: object names are content hashes shared between users, so
+-- UPDATE or DELETE would let anyone holding the anon key overwrite or wipe every user's diagrams. Uploads do not
+-- upsert, an existing name already holds the same bytes.
+
+DROP POLICY IF EXISTS "diagrams_select" ON storage.objects;
+DROP POLICY IF EXISTS "diagrams_insert" ON storage.objects;
+DROP POLICY IF EXISTS "diagrams_update" ON storage.objects;
+DROP POLICY IF EXISTS "diagrams_delete" ON storage.objects;
+
+CREATE POLICY "diagrams_select" ON storage.objects
+    FOR SELECT TO anon, authenticated
+    USING (bucket_id = 'diagrams');
+CREATE POLICY "diagrams_insert" ON storage.objects
+    FOR INSERT TO anon, authenticated
+    WITH CHECK (bucket_id = 'diagrams');
@@ -0,0 +1,274 @@
+#local first pass over paper-mode questions: decides "diagram request or not" with keyword rules (plus an optional
+#embedding similarity check) and only hands genuinely ambiguous queries to the LLM rewrite
+from __future__ import annotations
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from latency import timed, record_query_latency
+ROUTER_EMBED_CHECK = os.getenv("ROUTER_EMBED_CHECK", "true").lower() == "true"
+ROUTER_EMBED_THRESHOLD = float(os.getenv("ROUTER_EMBED_THRESHOLD", "0.55"))
+ROUTER_EMBED_MARGIN = float(os.getenv("ROUTER_EMBED_MARGIN", "0.1"))
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "4"))
+DIAGRAM_NOUNS = {
+    "diagram", "diagrams", "flowchart", "flowcharts", "schematic", "schematics", "d2",
+    "visualization", "visualisation", "illustration", "drawing", "sketch", "mindmap",
+}
+DIAGRAM_PHRASES = ("flow chart", "block diagram", "mind map", "visual representation")
+STRONG_VERBS = {"draw", "sketch", "visualize", "visualise", "diagram", "diagramme", "illustrate"}
+WEAK_VERBS = {"generate", "create", "make", "show", "plot", "render", "produce", "depict", "build", "design", "give"}
+STRUCTURE_NOUNS = {
+    "architecture", "pipeline", "workflow", "flow", "structure", "process", "framework",
+    "topology", "layout", "components", "stages", "steps", "overview", "system",
+}
+_POLITE_PREFIX_RE = re.compile(
+    r"^(?:(?:please|kindly|hey|hi|ok|okay|now|so)\s*,?\s+)*"
+    r"(?:(?:can|could|would|will)\s+you\s+(?:please\s+)?|i\s+(?:want|need|would\s+like|'d\s+like)\s+(?:you\s+to\s+|to\s+)?"
+    r"|i'd\s+like\s+(?:you\s+to\s+|to\s+)?|help\s+me\s+|let's\s+|lets\s+)?",
+    re.I,
+)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_FILLER_RE = re.compile(
+    r"\b(?:me|us|a|an|the|some|simple|quick|detailed|high[- ]level|nice|clear|of|for|about|showing|that\s+shows|"
+    r"which\s+shows|depicting|illustrating|describing|on|using|with|in|d2|please|it|this|that|these|those|them)\b",
+    re.I,
+)
+DIAGRAM_PROTOTYPES = (
+    "draw a diagram of the model architecture",
+    "generate a flowchart of the training pipeline",
+    "visualize the system components and how they connect",
+    "sketch the data flow between modules",
+    "create a block diagram of the proposed method",
+)
+PLAIN_PROTOTYPES = (
+    "what dataset was used for evaluation",
+    "what accuracy does the model achieve",
+    "explain the loss function",
+    "who are the authors of the paper",
+    "what are the limitations of the approach",
+)
+_PAPER_LOOKUP_RE = re.compile(
+    r"^(?:find|search\s+for|search|get|fetch|load|ingest|download|look\s+up|pull\s+up|open|import)\s+"
+    r"(?:me\s+)?(?:the\s+|a\s+|an\s+|this\s+)?(?:research\s+)?(?:paper|article|publication|preprint)s?(?=[\s:]|$)\s*" #keyword must end there, not "paper's ..."
+    r"(?:titled|called|named|entitled|on|about|:)?\s*[\"'“]?(?P<title>.+?)[\"'”]?\s*[?.!]*$",
+    re.I,
+)
+_CURRENT_INFO_RE = re.compile(
+    #explicit recency phrases only; lone words like "latest", "currently", "news" or "forecast" are common in paper
+    #questions, anything less explicit is left to the model, which can still pick web_search
+    r"\b(?:latest|breaking|today's|current)\s+(?:news|headlines|updates?|developments|events|price|prices|weather|scores?)\b"
+    r"|\b(?:news|headlines|weather|price|prices|scores?)\s+(?:today|tonight|right\s+now|this\s+(?:morning|evening|week))\b"
+    r"|\b(?:right\s+now|as\s+of\s+(?:today|now))\b"
+    r"|\b(?:who\s+won|what\s+happened)\b.*\b(?:yesterday|today|tonight|last\s+night)\b"
+    r"|\blive\s+scores?\b",
+    re.I,
+)
+_WEB_SEARCH_RE = re.compile(r"^(?:search\s+the\s+web|search\s+online|google|look\s+online)\s+(?:for\s+)?(?P<query>.+)$", re.I)
+@dataclass
+class IntentDecision:
+    tool: str #"research_lookup" or "web_search"
+    payload: Dict[str, str]
+    reason: str = ""
+    def as_response(self) -> Dict[str, object]:
+        #shaped like ClaudeMCPClient.send_message output so the dispatch code is shared
+        return {"content": [], "__tool_name": self.tool, "__tool_payload": self.payload, "__routed_locally": True}
+@dataclass
+class RouteDecision:
+    needs_rewriting: bool
+    rewritten_query: str
+    source: str #"rules", "embedding" or "llm"
+    reason: str = ""
+    def as_rewrite(self) -> Dict[str, object]:
+        #same shape new_groq_rewrite returns, so callers don't care who decided
+        return {"needs_rewriting": self.needs_rewriting, "rewritten_query": self.rewritten_query}
+_counts: Dict[str, int] = {
+    "rules": 0, "embedding": 0, "llm": 0, "llm_errors": 0, "speculation_hits": 0, "speculation_misses": 0,
+    "speculation_queued": 0,
+}
+_intent_counts: Dict[str, int] = {"research_lookup": 0, "web_search": 0, "model": 0}
+_lock = threading.Lock()
+_prototypes: Optional[Dict[str, np.ndarray]] = None
+_speculation_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculative-retrieval")
+def _count(key: str) -> None:
+    with _lock:
+        _counts[key] = _counts.get(key, 0) + 1
+def router_stats() -> Dict[str, float]:
+    with _lock:
+        stats: Dict[str, float] = dict(_counts)
+    total = stats["rules"] + stats["embedding"] + stats["llm"]
+    stats["total"] = total
+    stats["llm_skipped_ratio"] = round((total - stats["llm"]) / total, 3) if total else 0.0
+    return stats
+def intent_stats() -> Dict[str, float]:
+    with _lock:
+        stats: Dict[str, float] = dict(_intent_counts)
+    total = sum(stats.values())
+    stats["total"] = total
+    stats["local_ratio"] = round((total - stats["model"]) / total, 3) if total else 0.0
+    return stats
+def reset_router_stats() -> None:
+    global _prototypes
+    with _lock:
+        for counts in (_counts, _intent_counts):
+            for k in counts:
+                counts[k] = 0
+        _prototypes = None
+def _strip_prefix(query: str) -> str:
+    return _POLITE_PREFIX_RE.sub("", query.strip(), count=1).strip()
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+def local_rewrite(query: str) -> str:
+    #"draw a diagram of the encoder architecture" -> "Describe the encoder architecture in the paper";
+    #returns "" when nothing is left to retrieve on
+    body = _strip_prefix(query).rstrip("?.! ")
+    words = body.split()
+    if words and words[0].lower() in STRONG_VERBS | WEAK_VERBS:
+        words = words[1:]
+    body = " ".join(words)
+    for phrase in DIAGRAM_PHRASES:
+        body = re.sub(rf"\b{phrase}s?\b", " ", body, flags=re.I)
+    body = " ".join(w for w in body.split() if w.lower().strip(",") not in DIAGRAM_NOUNS)
+    subject = " ".join(_FILLER_RE.sub(" ", body).split())
+    if not subject:
+        return ""
+    return f"Describe the {subject} in the paper"
+def classify_by_rules(query: str) -> Optional[bool]:
+    #True = diagram request, False = plain question, None = can't tell from keywords alone
+    text = _strip_prefix(query).lower()
+    words = _words(text)
+    if not words:
+        return False
+    verb = words[0]
+    has_noun = bool(DIAGRAM_NOUNS & set(words)) or any(p in text for p in DIAGRAM_PHRASES)
+    has_structure = bool(STRUCTURE_NOUNS & set(words))
+    if verb in STRONG_VERBS:
+        return True
+    if verb in WEAK_VERBS:
+        if has_noun:
+            return True
+        return None if has_structure else False
+    if has_noun:
+        return None #"what does the diagram in figure 2 show" vs "I need a diagram of ..."
+    return False
+def _unit(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms == 0, 1.0, norms)
+def classify_by_embedding(query: str, embed: Callable[[List[str]], Sequence[Sequence[float]]]) -> Optional[bool]:
+    global _prototypes
+    if _prototypes is None:
+        vecs = _unit(np.asarray(embed(list(DIAGRAM_PROTOTYPES) + list(PLAIN_PROTOTYPES)), dtype=np.float32))
+        _prototypes = {"diagram": vecs[: len(DIAGRAM_PROTOTYPES)], "plain": vecs[len(DIAGRAM_PROTOTYPES):]}
+    q = _unit(np.asarray(embed([query]), dtype=np.float32))[0]
+    diagram = float((_prototypes["diagram"] @ q).max())
+    plain = float((_prototypes["plain"] @ q).max())
+    if diagram >= ROUTER_EMBED_THRESHOLD and diagram - plain >= ROUTER_EMBED_MARGIN:
+        return True
+    if plain >= ROUTER_EMBED_THRESHOLD and plain - diagram >= ROUTER_EMBED_MARGIN:
+        return False
+    return None
+def _local_decision(query: str, verdict: Optional[bool], source: str) -> Optional[RouteDecision]:
+    if verdict is False:
+        _count(source)
+        return RouteDecision(False, query, source, "no diagram request")
+    if verdict is True:
+        rewritten = local_rewrite(query)
+        if rewritten:
+            _count(source)
+            return RouteDecision(True, rewritten, source, "diagram request")
+    return None #undecided, or a diagram request with no subject left for a local rewrite
+def _route_after_rules(
+    query: str,
+    verdict: Optional[bool],
+    llm_rewrite: Callable[[str], Dict[str, object]],
+    embed: Optional[Callable[[List[str]], Sequence[Sequence[float]]]],
+) -> RouteDecision:
+    #the slow part of the router: embedding similarity when the rules were undecided, then the LLM rewrite
+    if verdict is None and embed is not None and ROUTER_EMBED_CHECK:
+        try:
+            decision = _local_decision(query, classify_by_embedding(query, embed), "embedding")
+        except Exception:
+            decision = None
+        if decision is not None:
+            return decision
+    _count("llm")
+    try:
+        result = llm_rewrite(query)
+        needs = bool(result.get("needs_rewriting"))
+        rewritten = str(result.get("rewritten_query") or query) if needs else query
+        return RouteDecision(needs, rewritten, "llm", "ambiguous query")
+    except Exception as e:
+        _count("llm_errors")
+        return RouteDecision(False, query, "llm", f"rewrite failed: {e}")
+def route_paper_query(
+    query: str,
+    llm_rewrite: Callable[[str], Dict[str, object]],
+    embed: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+) -> RouteDecision:
+    verdict = classify_by_rules(query)
+    decision = _local_decision(query, verdict, "rules")
+    if decision is not None:
+        return decision
+    return _route_after_rules(query, verdict, llm_rewrite, embed)
+def route_and_retrieve(
+    query: str,
+    llm_rewrite: Callable[[str], Dict[str, object]],
+    retrieve: Callable[[str, Optional[Dict[str, float]]], str],
+    embed: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+    speculative: Optional[bool] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[RouteDecision, str]:
+    #the keyword rules settle most queries in microseconds and are checked first; only when the embedding check
+    #or LLM rewrite has to run does retrieval for the query as typed start alongside it, and a second retrieval
+    #is issued only if the router then changed the query. Latency is recorded here, once, for the retrieval whose
+    #context is used, so retrieve should not record it itself
+    speculative = SPECULATIVE_RETRIEVAL if speculative is None else speculative
+    timings = {} if timings is None else timings
+    with timed(timings, "route_ms"):
+        verdict = classify_by_rules(query)
+        decision = _local_decision(query, verdict, "rules")
+    if decision is not None:
+        context = retrieve(decision.rewritten_query if decision.needs_rewriting else query, timings)
+        record_query_latency(timings)
+        return decision, context
+    spec_timings: Dict[str, float] = {} #kept apart so a discarded speculation doesn't pollute the caller's timings
+    future = _speculation_pool.submit(retrieve, query, spec_timings) if speculative else None
+    with timed(timings, "route_ms"):
+        decision = _route_after_rules(query, verdict, llm_rewrite, embed)
+    target = decision.rewritten_query if decision.needs_rewriting else query
+    if future is not None and target != query:
+        _count("speculation_misses")
+        future.cancel() #only helps if it never started; otherwise it just warms the retrieval cache
+        future = None
+    elif future is not None and future.cancel():
+        #still queued behind other users' speculations when the route was decided: run it here instead of waiting
+        _count("speculation_queued")
+        future = None
+    if future is not None:
+        _count("speculation_hits") #already running or done, waiting for it is never slower than starting over
+        context = future.result()
+        timings.update(spec_timings)
+    else:
+        context = retrieve(target, timings)
+    record_query_latency(timings)
+    return decision, context
+def route_general_message(message: str) -> Optional[IntentDecision]:
+    #general mode: clear tool requests are dispatched here, None means "ask the model"
+    text = _strip_prefix(message).strip()
+    lookup = _PAPER_LOOKUP_RE.match(text)
+    if lookup and len(lookup.group("title").split()) >= 2:
+        with _lock:
+            _intent_counts["research_lookup"] += 1
+        return IntentDecision("research_lookup", {"paper_title": lookup.group("title").strip()}, "paper lookup request")
+    web = _WEB_SEARCH_RE.match(text)
+    if web or _CURRENT_INFO_RE.search(text):
+        query = (web.group("query") if web else text).strip().rstrip("?.!") or message
+        with _lock:
+            _intent_counts["web_search"] += 1
+        return IntentDecision("web_search", {"query": query}, "explicit search" if web else "time-sensitive question")
+    with _lock:
+        _intent_counts["model"] += 1
+    return None
@@ -1,7 +1,7 @@
 from __future__ import annotations
 import os
 import time
-import requests
+from http_client import get_session, timeout
 from typing import List, Dict, Any
 S2_BASE = "https://api.semanticscholar.org/graph/v1" #to search papers on semantic scholar
 S2_API_KEY = os.getenv("S2_API_KEY")
@@ -49,11 +49,11 @@ def search_papers(query: str, limit: int = 5) -> List[Dict[str, Any]]:
     for attempt in range(2):
         try:
             _respect_rate()
-            response = requests.get(
+            response = get_session().get(
                 url,
                 headers=_headers(),
                 params=params,
-                timeout=20
+                timeout=timeout(20)
             )
             response.raise_for_status()
             data = response.json().get("data", [])
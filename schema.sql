@@ -17,7 +17,7 @@ CREATE TABLE papers (
     title TEXT NOT NULL,
     pdf_url TEXT NOT NULL,
     bm25_state JSONB,
-    status TEXT DEFAULT 'ingested',
+    status TEXT DEFAULT 'queued', -- queued | parsing | embedding | indexing | ready | failed
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -31,6 +31,10 @@ CREATE TABLE paper_chunks (
     caption TEXT,
     text TEXT NOT NULL,
     grounding INTEGER,
+    vector_id TEXT,
+    embedding TEXT,
+    sparse_embedding JSONB,
+    embed_model TEXT,
     created_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -47,7 +51,37 @@ CREATE TABLE paper_chats (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
--- Indexes for performance
-CREATE INDEX idx_papers_user_id ON papers(user_id);
-CREATE INDEX idx_chunks_paper_id ON paper_chunks(paper_id);
-CREATE INDEX idx_chats_paper_id ON paper_chats(paper_id);
+-- Background ingestion jobs
+CREATE TABLE ingest_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    paper_id INTEGER REFERENCES papers(id) ON DELETE CASCADE,
+    source_kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    num_vectors INTEGER,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Indexes for performance (matched to the (user_id, paper_id) filters and id/created_at ordering in supabase_client.py)
+CREATE INDEX idx_papers_user_created ON papers(user_id, created_at DESC) INCLUDE (id, title, pdf_url, status);
+CREATE INDEX idx_chunks_paper_user_id ON paper_chunks(paper_id, user_id, id);
+CREATE INDEX idx_chats_paper_user_id ON paper_chats(paper_id, user_id, id);
+CREATE INDEX idx_chats_paper_user_created ON paper_chats(paper_id, user_id, created_at);
+CREATE INDEX idx_ingest_jobs_user_id ON ingest_jobs(user_id);
+
+-- Storage bucket for rendered diagram SVGs (paper_chats.svg_path is the object name)
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('diagrams', 'diagrams', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- The app uses the anon key, so the private bucket needs policies (scoped to this bucket only, read and create only)
+CREATE POLICY "diagrams_select" ON storage.objects
+    FOR SELECT TO anon, authenticated
+    USING (bucket_id = 'diagrams');
+CREATE POLICY "diagrams_insert" ON storage.objects
+    FOR INSERT TO anon, authenticated
+    WITH CHECK (bucket_id = 'diagrams');
@@ -5,16 +5,23 @@ load_dotenv()
 import os
 import json
 import bcrypt
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
 from supabase import create_client, Client
 from pinecone import Pinecone
+from cache_utils import LRUCache
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "researchmcp")
+SUPABASE_DIAGRAM_BUCKET = os.getenv("SUPABASE_DIAGRAM_BUCKET", "diagrams")
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "10"))
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "60")) #bounds staleness when another process (ingest worker) writes
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("SUPABASE_URL or SUPABASE_ANON_KEY missing.")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_user_cache = LRUCache(maxsize=1024, ttl=LOOKUP_CACHE_TTL) #user_id -> user row
+_papers_cache = LRUCache(maxsize=1024, ttl=LOOKUP_CACHE_TTL) #user_id -> paper list
 _pc = None
 _index = None
 def _pinecone():
@@ -54,12 +61,15 @@ def create_user(username: str, password: str) -> Dict[str, Any]:
     if not result.data:
         return {"error": "Failed to create user."}
     user = result.data[0]
-    return {
+    created = {
         "id": user["id"],
         "username": user["username"],
         "namespace": user["namespace"],
         "created_at": user.get("created_at"),
     }
+    _user_cache.set(created["id"], dict(created))
+    _papers_cache.pop(created["id"])
+    return created
 def authenticate_user(username: str, password: str) -> Dict[str, Any]:
     result = (
         supabase.table("users")
@@ -77,7 +87,15 @@ def authenticate_user(username: str, password: str) -> Dict[str, Any]:
         "username": user["username"],
         "namespace": user["namespace"],
     }
+def invalidate_user_lookups(user_id: str) -> None:
+    _user_cache.pop(user_id)
+    _papers_cache.pop(user_id)
+def lookup_cache_stats() -> Dict[str, Any]:
+    return {"users": _user_cache.stats(), "papers": _papers_cache.stats()}
 def list_papers_for_user(user_id: str) -> List[Dict[str, Any]]:
+    cached = _papers_cache.get(user_id)
+    if cached is not None:
+        return [dict(p) for p in cached] #copies, callers may mutate rows
     res = (
         supabase.table("papers")
         .select("id, title, pdf_url, created_at, status")
@@ -85,7 +103,9 @@ def list_papers_for_user(user_id: str) -> List[Dict[str, Any]]:
         .order("created_at", desc=True)
         .execute()
     )
-    return res.data or []
+    papers = res.data or []
+    _papers_cache.set(user_id, [dict(p) for p in papers])
+    return papers
 def get_chat_history(
     user_id: str,
     paper_id: int,
@@ -101,7 +121,31 @@ def get_chat_history(
         .execute()
     )
     return res.data or []
+def get_chat_history_page(
+    user_id: str,
+    paper_id: int,
+    before_id: Optional[int] = None,
+    limit: int = CHAT_PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    #keyset pagination on paper_chats.id (serial, so it follows created_at): newest page first, turns returned
+    #oldest-to-newest; the second value is the cursor for the next older page, None once history is exhausted
+    query = (
+        supabase.table("paper_chats")
+        .select("id, question, answer, d2_code, svg_path, source_type")
+        .eq("user_id", user_id)
+        .eq("paper_id", paper_id)
+    )
+    if before_id is not None:
+        query = query.lt("id", before_id)
+    res = query.order("id", desc=True).limit(limit + 1).execute() #one extra row tells us whether an older page exists
+    rows = res.data or []
+    has_more = len(rows) > limit
+    page = list(reversed(rows[:limit]))
+    return page, (page[0]["id"] if has_more and page else None)
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return dict(cached)
     res = (
         supabase.table("users")
         .select("id, username, namespace, created_at")
@@ -109,7 +153,10 @@ def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         .limit(1)
         .execute()
     )
-    return res.data[0] if res.data else None
+    if not res.data:
+        return None #misses are not cached, the user may be created a moment later
+    _user_cache.set(user_id, dict(res.data[0]))
+    return res.data[0]
 def save_bm25_state(user_id: str, paper_id: int, state: Dict[str, Any]):
     supabase.table("papers").update({
         "bm25_state": json.dumps(state)
@@ -132,7 +179,9 @@ def load_bm25_state(user_id: str, paper_id: int) -> Optional[Dict[str, Any]]:
         except:
             return None
     return raw
-def create_paper(user_id: str, title: str, pdf_url: str):
+PAPER_STATUSES = ("queued", "parsing", "embedding", "indexing", "ready", "failed")
+READY_STATUSES = ("ready", "ingested") #"ingested" is what rows created before the job queue carry
+def create_paper(user_id: str, title: str, pdf_url: str, status: str = "queued"):
     # if not pdf_url.startswith("http"):
     #     raise RuntimeError("Invalid PDF URL provided.")
     res = (
@@ -141,13 +190,85 @@ def create_paper(user_id: str, title: str, pdf_url: str):
             "user_id": user_id,
             "title": title,
             "pdf_url": pdf_url,
-            "status": "ingested",
+            "status": status,
         })
         .execute()
     )
     if not res.data:
         raise RuntimeError("Failed to insert paper")
+    _papers_cache.pop(user_id)
+    return res.data[0]
+def delete_paper(user_id: str, paper_id: int) -> None:
+    #paper_chunks, paper_chats and ingest_jobs rows go with it (ON DELETE CASCADE)
+    supabase.table("papers").delete().eq("id", paper_id).eq("user_id", user_id).execute()
+    _papers_cache.pop(user_id)
+def update_paper_status(user_id: str, paper_id: int, status: str) -> None:
+    if status not in PAPER_STATUSES:
+        raise ValueError(f"Unknown paper status '{status}'.")
+    supabase.table("papers").update({
+        "status": status
+    }).eq("id", paper_id).eq("user_id", user_id).execute()
+    _papers_cache.pop(user_id) #only clears this process; the UI also invalidates when it sees a job finish
+def create_ingest_job(user_id: str, paper_id: int, source_kind: str, source: str) -> Dict[str, Any]:
+    res = (
+        supabase.table("ingest_jobs")
+        .insert({
+            "user_id": user_id,
+            "paper_id": paper_id,
+            "source_kind": source_kind,
+            "source": source,
+            "status": "queued",
+            "progress": 0.0,
+        })
+        .execute()
+    )
+    if not res.data:
+        raise RuntimeError("Failed to insert ingest job")
     return res.data[0]
+def update_ingest_job(job_id: int, **fields: Any) -> None:
+    fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+    supabase.table("ingest_jobs").update(fields).eq("id", job_id).execute()
+def get_ingest_jobs(job_ids: List[int]) -> List[Dict[str, Any]]:
+    if not job_ids:
+        return []
+    res = (
+        supabase.table("ingest_jobs")
+        .select("id, paper_id, status, progress, error, num_vectors, created_at, updated_at")
+        .in_("id", job_ids)
+        .order("id")
+        .execute()
+    )
+    return res.data or []
+def list_ingest_jobs_for_user(user_id: str, statuses: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    #jobs with their paper's title/pdf_url (embedded through the paper_id foreign key), oldest first
+    res = (
+        supabase.table("ingest_jobs")
+        .select("id, paper_id, status, progress, error, num_vectors, created_at, updated_at, papers(title, pdf_url)")
+        .eq("user_id", user_id)
+        .in_("status", list(statuses))
+        .order("id")
+        .execute()
+    )
+    return res.data or []
+def list_ingest_jobs_for_paper(user_id: str, paper_id: int, statuses: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    res = (
+        supabase.table("ingest_jobs")
+        .select("id, status")
+        .eq("user_id", user_id)
+        .eq("paper_id", paper_id)
+        .in_("status", list(statuses))
+        .execute()
+    )
+    return res.data or []
+def list_stale_ingest_jobs(statuses: Tuple[str, ...], updated_before: str) -> List[Dict[str, Any]]:
+    res = (
+        supabase.table("ingest_jobs")
+        .select("id, user_id, paper_id, status, updated_at")
+        .in_("status", list(statuses))
+        .lt("updated_at", updated_before)
+        .execute()
+    )
+    return res.data or []
 def save_paper_chunks(user_id: str, paper_id: int, chunks: List[Dict[str, Any]]) -> None:
     if not chunks:
         return
@@ -160,6 +281,10 @@ def save_paper_chunks(user_id: str, paper_id: int, chunks: List[Dict[str, Any]])
             "caption": c.get("caption") or "",
             "text": c.get("text") or "",
             "grounding": c.get("grounding"),
+            "vector_id": c.get("vector_id"),
+            "embedding": c.get("embedding"),
+            "sparse_embedding": c.get("sparse_embedding"),
+            "embed_model": c.get("embed_model"),
         }
         for c in chunks
     ]
@@ -176,6 +301,24 @@ def get_chunks_for_paper(user_id: str, paper_id: int) -> List[Dict[str, Any]]:
         .execute()
     )
     return res.data or []
+def get_chunk_vectors_page(
+    user_id: str,
+    paper_id: int,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    #keyset pagination over the stored vectors for reindexing; the second value is the cursor for the next page,
+    #None once the paper is exhausted
+    query = (
+        supabase.table("paper_chunks")
+        .select("id, page, type, caption, text, grounding, vector_id, embedding, sparse_embedding, embed_model")
+        .eq("user_id", user_id)
+        .eq("paper_id", paper_id)
+    )
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    rows = query.order("id").limit(limit).execute().data or []
+    return rows, (rows[-1]["id"] if len(rows) == limit else None)
 def append_chat_turn(
     user_id: str,
     paper_id: int,
@@ -195,4 +338,23 @@ def append_chat_turn(
             "svg_path": svg_path,
             "source_type": source_type, 
         }
-    ).execute()
\ No newline at end of file
+    ).execute()
+def _is_duplicate_upload(error: Exception) -> bool:
+    #storage answers 409 "Duplicate" / "The resource already exists" when the object name is taken
+    text = str(error)
+    return "Duplicate" in text or "already exists" in text or "409" in text
+def upload_diagram_svg(object_path: str, svg_bytes: bytes) -> str:
+    #object names are content hashes, so an existing object already holds these bytes; no upsert means the
+    #bucket needs no UPDATE policy and nobody can overwrite another user's diagram
+    try:
+        supabase.storage.from_(SUPABASE_DIAGRAM_BUCKET).upload(
+            path=object_path,
+            file=svg_bytes,
+            file_options={"content-type": "image/svg+xml", "upsert": "false"},
+        )
+    except Exception as e:
+        if not _is_duplicate_upload(e):
+            raise
+    return object_path
+def download_diagram_svg(object_path: str) -> bytes:
+    return supabase.storage.from_(SUPABASE_DIAGRAM_BUCKET).download(object_path)
@@ -0,0 +1,57 @@
+# tests/test_bm25_state.py
+# Tests for the stored BM25 encoder state
+# Run with: pytest tests/ -v
+
+import pytest
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+bm25_state = pytest.importorskip("bm25_state")
+
+TEXTS = [
+    "Attention is all you need for sequence transduction",
+    "Deep residual learning eases the training of very deep networks",
+    "Layer normalization stabilizes the hidden state dynamics",
+]
+QUERIES = ["attention for transduction", "residual networks training"]
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    try:
+        return bm25_state.fit_bm25(TEXTS)
+    except LookupError as e:  # tokenizer data (nltk stopwords/punkt) not available offline
+        pytest.skip(f"BM25 tokenizer data not installed: {e}")
+
+
+class TestBM25State:
+    """Test the v2 round trip and the legacy migration"""
+
+    def test_v2_round_trip_keeps_query_encoding(self, fitted):
+        """Test that an encoder loaded from JSON state encodes queries like the fitted one"""
+        state = json.loads(json.dumps(bm25_state.bm25_to_state(fitted)))  # as stored in the JSONB column
+        assert state["version"] == bm25_state.BM25_STATE_VERSION
+        assert "texts" not in state
+        assert not bm25_state.is_legacy_bm25_state(state)
+        loaded = bm25_state.bm25_from_state(state)
+        assert loaded.encode_queries(QUERIES) == fitted.encode_queries(QUERIES)
+
+    def test_legacy_texts_state_is_refitted(self, fitted):
+        """Test that a texts-only state migrates to an equivalent v2 encoder"""
+        legacy = {"texts": TEXTS}
+        assert bm25_state.is_legacy_bm25_state(legacy)
+        loaded = bm25_state.bm25_from_state(legacy)
+        assert loaded.encode_queries(QUERIES) == fitted.encode_queries(QUERIES)
+        migrated = bm25_state.bm25_to_state(loaded)
+        assert bm25_state.bm25_from_state(migrated).encode_queries(QUERIES) == fitted.encode_queries(QUERIES)
+
+    def test_empty_legacy_state_raises(self):
+        """Test that a legacy row without texts asks for a re-ingest"""
+        assert not bm25_state.is_legacy_bm25_state(None)
+        with pytest.raises(RuntimeError):
+            bm25_state.bm25_from_state({"texts": []})
+
+# Run tests with: pytest tests/ -v
@@ -0,0 +1,131 @@
+# tests/test_cache_utils.py
+# Tests for the persistent ingest caches
+# Run with: pytest tests/ -v
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_utils import DiskCache, LRUCache, ParseCache, TieredCache, content_key, normalize_text
+
+
+class TestContentKey:
+    """Test content-addressed cache keys"""
+
+    def test_whitespace_is_normalized(self):
+        """Test that reflowed text maps to the same key"""
+        a = content_key("model", normalize_text("Attention  is\nall you need"))
+        b = content_key("model", normalize_text(" Attention is all you need "))
+        assert a == b
+
+    def test_model_name_is_part_of_key(self):
+        """Test that different models never share entries"""
+        assert content_key("model-a", "text") != content_key("model-b", "text")
+
+
+class TestDiskCache:
+    """Test DiskCache storage and eviction"""
+
+    def test_get_many_reports_hits_and_misses(self, tmp_path):
+        """Test that only stored keys are returned"""
+        cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=1024)
+        cache.set_many([("a", b"1"), ("b", b"2")])
+        assert cache.get_many(["a", "b", "c"]) == {"a": b"1", "b": b"2"}
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test that the size bound evicts the oldest entries first"""
+        cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=20)
+        cache.set("old", b"x" * 8)
+        cache.set("new", b"y" * 8)
+        cache.get("old")
+        cache.set("newest", b"z" * 8)
+        assert cache.get("new") is None
+        assert cache.get("old") == b"x" * 8
+        assert cache.stats()["bytes"] <= 20
+
+class TestLRUCache:
+    """Test the in-process LRU"""
+
+    def test_evicts_oldest_and_counts(self):
+        """Test bounded size, recency order and hit/miss counters"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1}
+
+    def test_ttl_expires_entries(self):
+        """Test that entries older than the TTL are dropped"""
+        cache = LRUCache(maxsize=4, ttl=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+    def test_tiered_cache_promotes_disk_hits(self, tmp_path):
+        """Test that a disk-tier hit refills the memory tier"""
+        disk = DiskCache(str(tmp_path / "q.sqlite"), max_bytes=10**6)
+        first = TieredCache(LRUCache(4), disk, dumps=lambda v: v.encode(), loads=lambda b: b.decode())
+        first.set("k", "vector")
+        second = TieredCache(LRUCache(4), disk, dumps=lambda v: v.encode(), loads=lambda b: b.decode())
+        assert second.get("k") == "vector"
+        assert second.memory.get("k") == "vector"
+
+
+class TestParseCache:
+    """Test the document parse cache with a fake parser"""
+
+    def _parser(self, version):
+        calls = []
+
+        def parse(doc):
+            def run():
+                calls.append(doc)
+                return [{"markdown": f"chunks of {doc}"}], version
+            return run
+        return calls, parse
+
+    def test_pinned_model_hits_across_instances(self, tmp_path):
+        """Test that a pinned model parses once and later instances reuse the stored parse"""
+        disk = DiskCache(str(tmp_path / "p.sqlite"), max_bytes=10**6)
+        calls, parse = self._parser("dpt-2-20250919")
+        first = ParseCache(disk, "dpt-2-20250919")
+        assert first.get_or_parse("url", "https://x/a.pdf", parse("a")) == [{"markdown": "chunks of a"}]
+        again = ParseCache(disk, "dpt-2-20250919").get_or_parse("url", "https://x/a.pdf", parse("a"))
+        assert again == [{"markdown": "chunks of a"}]
+        assert calls == ["a"]
+
+    def test_url_and_sha256_keys_do_not_collide(self, tmp_path):
+        """Test that the same identifier under another source kind is a miss"""
+        cache = ParseCache(DiskCache(str(tmp_path / "p.sqlite"), max_bytes=10**6), "dpt-2-20250919")
+        calls, parse = self._parser("dpt-2-20250919")
+        cache.get_or_parse("url", "abc", parse("from-url"))
+        assert cache.get_or_parse("sha256", "abc", parse("from-file")) == [{"markdown": "chunks of from-file"}]
+        assert calls == ["from-url", "from-file"]
+
+    def test_alias_keys_on_reported_version(self, tmp_path):
+        """Test that a "latest" alias never serves a parse made by another resolved version"""
+        disk = DiskCache(str(tmp_path / "p.sqlite"), max_bytes=10**6)
+        old_calls, old_parse = self._parser("dpt-2-20250101")
+        ParseCache(disk, "dpt-2-latest").get_or_parse("url", "u", old_parse("a"))
+        cache = ParseCache(disk, "dpt-2-latest")  # new process, alias now resolves to a newer model
+        new_calls, new_parse = self._parser("dpt-2-20250919")
+        cache.get_or_parse("url", "u", new_parse("a"))
+        assert new_calls == ["a"]  # nothing resolved yet in this process, so no lookup
+        cache.get_or_parse("url", "u", new_parse("a"))
+        assert new_calls == ["a"] and old_calls == ["a"]
+
+    def test_disabled_disk_always_parses(self):
+        """Test that a cache without a disk tier just calls the parser"""
+        calls, parse = self._parser("v1")
+        cache = ParseCache(None, "v1")
+        cache.get_or_parse("url", "u", parse("a"))
+        cache.get_or_parse("url", "u", parse("a"))
+        assert calls == ["a", "a"]
+
+# Run tests with: pytest tests/ -v
@@ -0,0 +1,74 @@
+# tests/test_context_builder.py
+# Tests for token-budgeted context assembly
+# Run with: pytest tests/ -v
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_builder import Snippet, assemble_context, estimate_tokens, truncate_table
+
+
+PARAGRAPH = (
+    "The encoder maps the input sequence to a continuous representation which the decoder "
+    "then consumes one token at a time while attending over all encoder outputs."
+)
+
+
+class TestAssembleContext:
+    """Test duplicate suppression and the token budget"""
+
+    def test_near_duplicates_are_dropped(self):
+        """Test that an overlapping chunk is suppressed"""
+        snippets = [
+            Snippet(PARAGRAPH, page=3, type="text", score=0.9),
+            Snippet(PARAGRAPH + " See Figure 1.", page=3, type="text", score=0.8),
+            Snippet("Training used 8 GPUs for 12 hours on WMT14.", page=7, type="text", score=0.5),
+        ]
+        blocks, stats = assemble_context(snippets, "how does the encoder work", budget=1000)
+        assert len(blocks) == 2
+        assert stats.dropped_duplicates == 1
+        assert stats.tokens_saved > 0
+
+    def test_budget_is_enforced(self):
+        """Test that output never exceeds the token budget"""
+        snippets = [
+            Snippet(f"Section {i}: " + "word " * 200, page=i, type="text", score=1.0 - i / 10)
+            for i in range(5)
+        ]
+        blocks, stats = assemble_context(snippets, "section", budget=400)
+        assert stats.output_tokens <= 400
+        assert sum(estimate_tokens(b) for b in blocks) == stats.output_tokens
+        assert stats.dropped_over_budget > 0
+
+
+class TestTruncateTable:
+    """Test cutting oversized tables down to matching rows"""
+
+    def test_markdown_table_keeps_header_and_matching_rows(self):
+        """Test that the header and the queried row survive"""
+        rows = [f"| model{i} | {i}.0 |" for i in range(30)]
+        table = "\n".join(["| Model | BLEU |", "|---|---|"] + rows)
+        out, truncated = truncate_table(table, "BLEU of model17", max_rows=5)
+        assert truncated
+        assert out.startswith("| Model | BLEU |\n|---|---|")
+        assert "| model17 | 17.0 |" in out
+        assert "25 rows omitted" in out
+
+    def test_html_table(self):
+        """Test that HTML tables from ADE are truncated too"""
+        rows = "".join(f"<tr><td>run{i}</td><td>{i}</td></tr>" for i in range(20))
+        table = f"<table><tr><th>Run</th><th>Loss</th></tr>{rows}</table>"
+        out, truncated = truncate_table(table, "loss of run12", max_rows=3)
+        assert truncated
+        assert "<th>Run</th>" in out
+        assert "<td>run12</td>" in out
+        assert out.endswith("</table>")
+
+    def test_small_table_untouched(self):
+        """Test that short tables are returned unchanged"""
+        table = "| a | b |\n|---|---|\n| 1 | 2 |"
+        assert truncate_table(table, "a", max_rows=5) == (table, False)
+
+# Run tests with: pytest tests/ -v
@@ -0,0 +1,202 @@
+# tests/test_d2_utils.py
+# Tests for D2 rendering and the SVG cache (the d2 CLI is faked)
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+d2_utils = pytest.importorskip("d2_utils")
+
+
+@pytest.fixture
+def fake_d2(tmp_path, monkeypatch):
+    calls = []
+
+    def run(cmd, check=False, capture_output=False, **kwargs):
+        if "--version" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, stdout="v0.6.test\n", stderr="")
+        calls.append(cmd)
+        src, out = cmd[-2], cmd[-1]
+        with open(src) as f:
+            code = f.read()
+        if "FAIL" in code:
+            raise subprocess.CalledProcessError(1, cmd)
+        with open(out, "w") as f:
+            f.write(f"<svg><!-- {code} --></svg>" + " " * 1000)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr(d2_utils.subprocess, "run", run)
+    monkeypatch.setattr(d2_utils, "D2_CACHE_DIR", str(tmp_path / "svgs"))
+    monkeypatch.setattr(d2_utils, "D2_CACHE_MAX_MB", 1)
+    d2_utils.d2_version.cache_clear()
+    yield calls
+    d2_utils.d2_version.cache_clear()
+
+
+class TestSvgCache:
+    def test_identical_source_renders_once(self, fake_d2):
+        first = d2_utils.render_d2_to_svg("A -> B")
+        second = d2_utils.render_d2_to_svg("A -> B\n")
+        assert first == second and os.path.exists(first)
+        assert len(fake_d2) == 1
+
+    def test_different_source_renders_again(self, fake_d2):
+        a = d2_utils.render_d2_to_svg("A -> B")
+        b = d2_utils.render_d2_to_svg("A -> C")
+        assert a != b and len(fake_d2) == 2
+
+    def test_key_depends_on_version_and_theme(self, fake_d2, monkeypatch):
+        assert d2_utils.svg_cache_key("A -> B", "0") != d2_utils.svg_cache_key("A -> B", "1")
+        before = d2_utils.svg_cache_key("A -> B")
+        d2_utils.d2_version.cache_clear()
+        monkeypatch.setattr(d2_utils.subprocess, "run", lambda *a, **k: subprocess.CompletedProcess(a, 0, stdout="v0.7\n"))
+        assert d2_utils.svg_cache_key("A -> B") != before
+
+    def test_temp_sources_are_removed(self, fake_d2):
+        d2_utils.render_d2_to_svg("A -> B")
+        assert not os.path.exists(fake_d2[0][-2])
+        leftovers = [n for n in os.listdir(d2_utils.D2_CACHE_DIR) if n.endswith(".tmp.svg")]
+        assert leftovers == []
+
+    def test_failed_render_raises_and_caches_nothing(self, fake_d2):
+        with pytest.raises(RuntimeError):
+            d2_utils.render_d2_to_svg("FAIL")
+        assert os.listdir(d2_utils.D2_CACHE_DIR) == []
+
+    def test_eviction_keeps_cache_under_limit(self, fake_d2, monkeypatch):
+        monkeypatch.setattr(d2_utils, "D2_CACHE_MAX_MB", 0.005)  # ~5KB, each fake svg is ~1KB
+        for i in range(12):
+            d2_utils.render_d2_to_svg(f"N{i} -> M{i}")
+        total = sum(os.path.getsize(os.path.join(d2_utils.D2_CACHE_DIR, n)) for n in os.listdir(d2_utils.D2_CACHE_DIR))
+        assert total <= 0.005 * 1024 * 1024
+
+
+class TestStoredSvg:
+    def test_store_and_reload_without_rendering(self, fake_d2):
+        bucket = {}
+
+        def upload(name, data):
+            bucket[name] = data
+            return name
+
+        local = d2_utils.render_d2_to_svg("A -> B")
+        stored = d2_utils.store_rendered_svg("A -> B", local, upload)
+        assert stored == d2_utils.stored_svg_name("A -> B")
+        os.remove(local)  # simulate a fresh process / evicted local cache
+        reloaded = d2_utils.load_stored_svg(stored, lambda name: bucket[name])
+        assert open(reloaded, "rb").read() == bucket[stored]
+        assert len(fake_d2) == 1  # served from storage, not re-rendered
+
+    def test_local_cache_hit_skips_download(self, fake_d2):
+        local = d2_utils.render_d2_to_svg("A -> B")
+
+        def download(name):
+            raise AssertionError("should not download")
+
+        assert d2_utils.load_stored_svg(d2_utils.stored_svg_name("A -> B"), download) == local
+
+    def test_upload_failure_returns_none(self, fake_d2):
+        def upload(name, data):
+            raise ConnectionError("storage down")
+
+        local = d2_utils.render_d2_to_svg("A -> B")
+        assert d2_utils.store_rendered_svg("A -> B", local, upload) is None
+
+    def test_rejects_non_hash_paths(self, fake_d2):
+        with pytest.raises(ValueError):
+            d2_utils.load_stored_svg("../../etc/passwd", lambda name: b"")
+
+
+class TestRenderService:
+    def test_timeout_is_reported_and_not_cached(self, fake_d2, monkeypatch):
+        attempts = []
+
+        def hang(cmd, **kwargs):
+            attempts.append(cmd)
+            raise subprocess.TimeoutExpired(cmd, kwargs.get("timeout"))
+
+        d2_utils.d2_version()  # cache the fake version before swapping the runner
+        monkeypatch.setattr(d2_utils.subprocess, "run", hang)
+        monkeypatch.setattr(d2_utils, "_failed_renders", d2_utils.LRUCache(16, ttl=60))
+        with pytest.raises(RuntimeError, match="timed out"):
+            d2_utils.render_d2_to_svg("slow -> diagram")
+        with pytest.raises(RuntimeError, match="timed out"):
+            d2_utils.render_d2_to_svg("slow -> diagram")
+        assert len(attempts) == 2  # an overloaded host may render it next time
+        assert d2_utils.render_stats()["timeouts"] >= 2
+
+    def test_rejected_source_is_cached(self, fake_d2, monkeypatch):
+        monkeypatch.setattr(d2_utils, "_failed_renders", d2_utils.LRUCache(16, ttl=60))
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="failed"):
+                d2_utils.render_d2_to_svg("FAIL -> here")
+        assert len(fake_d2) == 1
+
+    def test_missing_binary_becomes_runtime_error(self, fake_d2, monkeypatch):
+        attempts = []
+
+        def missing(cmd, **kwargs):
+            attempts.append(cmd)
+            raise FileNotFoundError(2, "No such file or directory", "d2")
+
+        d2_utils.d2_version()
+        monkeypatch.setattr(d2_utils.subprocess, "run", missing)
+        monkeypatch.setattr(d2_utils, "_failed_renders", d2_utils.LRUCache(16, ttl=60))
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="could not be run"):
+                d2_utils.render_d2_to_svg("A -> Missing")
+        assert len(attempts) == 2
+
+    def test_memory_cap_wraps_command_with_prlimit(self, fake_d2, monkeypatch):
+        monkeypatch.setattr(d2_utils, "_prlimit_binary", lambda: "/usr/bin/prlimit")
+        monkeypatch.setattr(d2_utils, "D2_RENDER_MEMORY_MB", 512)
+        d2_utils.render_d2_to_svg("A -> Capped")
+        assert fake_d2[-1][:3] == ["/usr/bin/prlimit", f"--as={512 * 1024 * 1024}", "d2"]
+        monkeypatch.setattr(d2_utils, "D2_RENDER_MEMORY_MB", 0)
+        d2_utils.render_d2_to_svg("A -> Uncapped")
+        assert fake_d2[-1][0] == "d2"
+
+    def test_busy_renderer_rejects(self, fake_d2, monkeypatch):
+        monkeypatch.setattr(d2_utils, "D2_RENDER_QUEUE_MAX", 0)
+        before = d2_utils.render_stats()["rejected"]
+        with pytest.raises(RuntimeError, match="busy"):
+            d2_utils.render_d2_to_svg("X -> Y")
+        assert d2_utils.render_stats()["rejected"] == before + 1
+
+    def test_concurrent_renders_respect_pool_and_coalesce(self, fake_d2, monkeypatch):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        active, peak = [0], [0]
+        lock = threading.Lock()
+        real_run = d2_utils.subprocess.run
+
+        def slow_run(cmd, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            try:
+                return real_run(cmd, **kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        d2_utils.d2_version()  # cache the fake version before swapping the runner
+        monkeypatch.setattr(d2_utils.subprocess, "run", slow_run)
+        monkeypatch.setattr(d2_utils, "_render_pool", ThreadPoolExecutor(max_workers=2))
+        futures = [d2_utils.submit_render(f"P{i % 4} -> Q") for i in range(8)]
+        paths = [f.result() for f in futures]
+        assert len(set(paths)) == 4
+        assert peak[0] <= 2
+        assert len(fake_d2) == 4
+
+    def test_async_api(self, fake_d2):
+        import asyncio
+        path = asyncio.run(d2_utils.render_d2_to_svg_async("A -> Async"))
+        assert os.path.exists(path)
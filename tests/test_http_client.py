@@ -0,0 +1,39 @@
+# tests/test_http_client.py
+# Tests for the shared pooled HTTP session
+# Run with: pytest tests/ -v
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+
+
+class TestSession:
+    def setup_method(self):
+        http_client.close_session()
+
+    def teardown_method(self):
+        http_client.close_session()
+
+    def test_session_is_shared(self):
+        assert http_client.get_session() is http_client.get_session()
+
+    def test_close_session_creates_fresh_one(self):
+        first = http_client.get_session()
+        http_client.close_session()
+        assert http_client.get_session() is not first
+
+    def test_adapter_pool_and_retry_config(self):
+        adapter = http_client.get_session().get_adapter("https://api.anthropic.com")
+        assert adapter._pool_maxsize == http_client.HTTP_POOL_MAXSIZE
+        retry = adapter.max_retries
+        assert retry.total == http_client.HTTP_RETRIES
+        assert "GET" in retry.allowed_methods
+        assert "POST" not in retry.allowed_methods
+        assert 429 in retry.status_forcelist
+
+    def test_timeout_caps_connect(self):
+        assert http_client.timeout(30) == (min(http_client.HTTP_CONNECT_TIMEOUT, 30), 30)
+        assert http_client.timeout(1) == (1, 1)
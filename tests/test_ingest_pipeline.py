@@ -0,0 +1,52 @@
+# tests/test_ingest_pipeline.py
+# Tests for the streaming ingest stage runner
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_pipeline import run_stages
+
+
+class TestRunStages:
+    """Test run_stages ordering, overlap and error handling"""
+
+    def test_results_keep_source_order(self):
+        """Test that every item passes through all stages in order"""
+        out = run_stages(range(10), [lambda x: x * 2, lambda x: x + 1])
+        assert out == [x * 2 + 1 for x in range(10)]
+
+    def test_stages_overlap(self):
+        """Test that a slow sink does not stop the first stage from working ahead"""
+        first_stage_done = threading.Event()
+
+        def produce(x):
+            if x == 2:
+                first_stage_done.set()
+            return x
+
+        def slow_sink(x):
+            if x == 0:
+                assert first_stage_done.wait(timeout=2)
+            return x
+
+        assert run_stages(range(3), [produce, slow_sink], maxsize=2) == [0, 1, 2]
+
+    def test_stage_error_is_raised(self):
+        """Test that a failing stage stops the pipeline and re-raises"""
+        def boom(x):
+            if x == 3:
+                raise ValueError("bad batch")
+            return x
+
+        started = time.time()
+        with pytest.raises(ValueError, match="bad batch"):
+            run_stages(range(1000), [boom, lambda x: x], maxsize=1)
+        assert time.time() - started < 5
+
+# Run tests with: pytest tests/ -v
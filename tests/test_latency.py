@@ -0,0 +1,41 @@
+# tests/test_latency.py
+# Tests for query-path latency tracking
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from latency import timed, record_query_latency, latency_summary, reset_latency_history
+
+
+class TestLatency:
+    """Test stage timers and the rolling summary"""
+
+    def test_timed_accumulates_per_stage(self):
+        """Test that repeated stages add up and None disables timing"""
+        timings = {}
+        with timed(timings, "vector_query_ms"):
+            pass
+        with timed(timings, "vector_query_ms"):
+            pass
+        with timed(None, "ignored"):
+            pass
+        assert list(timings) == ["vector_query_ms"]
+        assert timings["vector_query_ms"] >= 0.0
+
+    def test_summary_percentiles(self):
+        """Test p50/p95 over the recorded window"""
+        reset_latency_history()
+        for ms in range(1, 101):
+            record_query_latency({"total_ms": float(ms)})
+        summary = latency_summary()["total_ms"]
+        assert summary["count"] == 100
+        assert summary["p50_ms"] == pytest.approx(50, abs=1)
+        assert summary["p95_ms"] == pytest.approx(95, abs=1)
+        assert summary["max_ms"] == 100
+        reset_latency_history()
+
+# Run tests with: pytest tests/ -v
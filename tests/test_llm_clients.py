@@ -0,0 +1,83 @@
+# tests/test_llm_clients.py
+# Tests for the shared LLM clients and concurrency limits
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+llm_clients = pytest.importorskip("llm_clients")
+
+
+class TestGroqClient:
+    def teardown_method(self):
+        llm_clients.reset_clients()
+
+    def test_client_is_reused(self, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+        assert llm_clients.get_groq_client() is llm_clients.get_groq_client()
+
+    def test_key_change_rebuilds_client(self, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "key-a")
+        first = llm_clients.get_groq_client()
+        monkeypatch.setenv("GROQ_API_KEY", "key-b")
+        assert llm_clients.get_groq_client() is not first
+
+    def test_missing_key_raises(self, monkeypatch):
+        monkeypatch.delenv("GROQ_API_KEY", raising=False)
+        with pytest.raises(RuntimeError):
+            llm_clients.get_groq_client()
+
+    def test_async_client_is_reused_within_loop(self, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "test-key")
+
+        async def both():
+            return llm_clients.get_async_groq_client(), llm_clients.get_async_groq_client()
+
+        a, b = asyncio.run(both())
+        assert a is b
+
+
+class TestSlots:
+    def test_sync_slot_limits_concurrency(self, monkeypatch):
+        monkeypatch.setitem(llm_clients._slots, "groq", threading.BoundedSemaphore(2))
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def work():
+            with llm_clients.llm_slot("groq"):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak[0] == 2
+
+    def test_async_slot_limits_concurrency(self, monkeypatch):
+        monkeypatch.setitem(llm_clients._limits, "anthropic", 3)
+        active, peak = [0], [0]
+
+        async def work():
+            async with llm_clients.async_llm_slot("anthropic"):
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+
+        async def main():
+            await asyncio.gather(*(work() for _ in range(8)))
+
+        asyncio.run(main())
+        assert peak[0] == 3
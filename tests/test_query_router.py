@@ -0,0 +1,248 @@
+# tests/test_query_router.py
+# Tests for the local diagram-query router
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_router
+from query_router import classify_by_rules, local_rewrite, route_paper_query, router_stats
+from latency import latency_summary, reset_latency_history
+
+
+def failing_rewrite(query):
+    raise AssertionError("LLM rewrite should not be called")
+
+
+class TestRules:
+    @pytest.mark.parametrize("query", [
+        "draw a diagram of the encoder architecture",
+        "Can you please generate a flowchart for the training pipeline?",
+        "Please create a block diagram of the proposed method",
+        "visualize the attention mechanism",
+    ])
+    def test_clear_diagram_requests(self, query):
+        assert classify_by_rules(query) is True
+
+    @pytest.mark.parametrize("query", [
+        "what dataset did they use",
+        "how did they create the dataset",
+        "explain the architecture",
+        "show me the results table",
+    ])
+    def test_plain_questions(self, query):
+        assert classify_by_rules(query) is False
+
+    @pytest.mark.parametrize("query", [
+        "show the architecture",
+        "what does the diagram in figure 2 show",
+    ])
+    def test_ambiguous_queries(self, query):
+        assert classify_by_rules(query) is None
+
+    def test_local_rewrite(self):
+        assert local_rewrite("draw a diagram of the encoder architecture") == "Describe the encoder architecture in the paper"
+        assert local_rewrite("visualize it") == ""
+
+
+class TestRoute:
+    def setup_method(self):
+        query_router.reset_router_stats()
+
+    def test_clear_cases_skip_llm(self):
+        d = route_paper_query("draw a flowchart of the training pipeline", failing_rewrite)
+        assert d.needs_rewriting and d.source == "rules"
+        assert d.rewritten_query == "Describe the training pipeline in the paper"
+        p = route_paper_query("what is the learning rate?", failing_rewrite)
+        assert not p.needs_rewriting and p.rewritten_query == "what is the learning rate?"
+        stats = router_stats()
+        assert stats["llm"] == 0 and stats["llm_skipped_ratio"] == 1.0
+
+    def test_ambiguous_falls_back_to_llm(self):
+        calls = []
+
+        def rewrite(q):
+            calls.append(q)
+            return {"needs_rewriting": True, "rewritten_query": "Describe the architecture"}
+
+        d = route_paper_query("show the architecture", rewrite)
+        assert calls == ["show the architecture"]
+        assert d.source == "llm" and d.rewritten_query == "Describe the architecture"
+        assert router_stats()["llm"] == 1
+
+    def test_diagram_without_subject_falls_back_to_llm(self):
+        d = route_paper_query("draw it", lambda q: {"needs_rewriting": False, "rewritten_query": q})
+        assert d.source == "llm" and not d.needs_rewriting
+
+    def test_llm_failure_keeps_original_query(self):
+        def boom(q):
+            raise RuntimeError("groq down")
+
+        d = route_paper_query("show the architecture", boom)
+        assert not d.needs_rewriting and d.rewritten_query == "show the architecture"
+        assert router_stats()["llm_errors"] == 1
+
+    def test_embedding_check_decides_ambiguous(self, monkeypatch):
+        monkeypatch.setattr(query_router, "ROUTER_EMBED_CHECK", True)
+        diagram_axis = {p: [1.0, 0.0] for p in query_router.DIAGRAM_PROTOTYPES}
+        plain_axis = {p: [0.0, 1.0] for p in query_router.PLAIN_PROTOTYPES}
+
+        def embed(texts):
+            return [diagram_axis.get(t) or plain_axis.get(t) or [0.9, 0.1] for t in texts]
+
+        d = route_paper_query("show the architecture", failing_rewrite, embed=embed)
+        assert d.needs_rewriting and d.source == "embedding"
+
+
+class TestSpeculativeRetrieval:
+    def setup_method(self):
+        query_router.reset_router_stats()
+        reset_latency_history()
+
+    def test_rule_decided_query_does_not_speculate(self):
+        calls = []
+
+        def retrieve(q, timings):
+            calls.append(q)
+            timings["query_ms"] = 1.0
+            return f"ctx:{q}"
+
+        d, ctx = query_router.route_and_retrieve("draw a diagram of the decoder", failing_rewrite, retrieve,
+                                                 speculative=True)
+        assert ctx == "ctx:Describe the decoder in the paper"
+        assert calls == ["Describe the decoder in the paper"]
+        d, ctx = query_router.route_and_retrieve("what is the learning rate?", failing_rewrite, retrieve,
+                                                 speculative=True)
+        assert calls[-1] == "what is the learning rate?" and len(calls) == 2
+        stats = router_stats()
+        assert stats["speculation_hits"] == 0 and stats["speculation_misses"] == 0
+        assert latency_summary()["query_ms"]["count"] == 2
+
+    def test_unchanged_query_reuses_speculative_result(self):
+        calls = []
+        started = threading.Event()
+
+        def retrieve(q, timings):
+            calls.append(q)
+            started.set()
+            timings["query_ms"] = 1.0
+            return f"ctx:{q}"
+
+        def no_rewrite(q):
+            assert started.wait(5)  # the speculation is running before the route is decided
+            return {"needs_rewriting": False, "rewritten_query": q}
+
+        timings = {}
+        d, ctx = query_router.route_and_retrieve("show the architecture", no_rewrite, retrieve,
+                                                 speculative=True, timings=timings)
+        assert d.source == "llm"
+        assert ctx == "ctx:show the architecture"
+        assert calls == ["show the architecture"]
+        assert "route_ms" in timings and timings["query_ms"] == 1.0
+        assert router_stats()["speculation_hits"] == 1
+        assert latency_summary()["query_ms"]["count"] == 1
+
+    def test_rewritten_query_triggers_second_retrieval(self):
+        calls = []
+
+        def retrieve(q, timings):
+            calls.append(q)
+            timings["query_ms"] = 1.0
+            return f"ctx:{q}"
+
+        def rewrite(q):
+            return {"needs_rewriting": True, "rewritten_query": "Describe the architecture in the paper"}
+
+        d, ctx = query_router.route_and_retrieve("show the architecture", rewrite, retrieve, speculative=True)
+        assert ctx == "ctx:Describe the architecture in the paper"
+        assert "Describe the architecture in the paper" in calls
+        assert router_stats()["speculation_misses"] == 1
+        assert latency_summary()["query_ms"]["count"] == 1  # the discarded speculation is not recorded
+
+    def test_queued_speculation_runs_inline(self, monkeypatch):
+        release = threading.Event()
+        busy = ThreadPoolExecutor(max_workers=1)
+        busy.submit(release.wait, 5)  # other users' speculations occupy the only worker
+        monkeypatch.setattr(query_router, "_speculation_pool", busy)
+        calls = []
+
+        def no_rewrite(q):
+            return {"needs_rewriting": False, "rewritten_query": q}
+
+        try:
+            d, ctx = query_router.route_and_retrieve("show the architecture", no_rewrite,
+                                                     lambda q, t: calls.append(q) or "ctx", speculative=True)
+        finally:
+            release.set()
+            busy.shutdown()
+        assert ctx == "ctx" and calls == ["show the architecture"]
+        stats = router_stats()
+        assert stats["speculation_queued"] == 1 and stats["speculation_hits"] == 0
+
+    def test_speculation_disabled(self):
+        calls = []
+
+        def no_rewrite(q):
+            return {"needs_rewriting": False, "rewritten_query": q}
+
+        d, ctx = query_router.route_and_retrieve("show the architecture", no_rewrite,
+                                                 lambda q, t: calls.append(q) or "ctx", speculative=False)
+        assert ctx == "ctx" and calls == ["show the architecture"]
+        assert router_stats()["speculation_hits"] == 0
+
+
+class TestGeneralIntent:
+    def setup_method(self):
+        query_router.reset_router_stats()
+
+    @pytest.mark.parametrize("message,title", [
+        ("find the paper titled Attention Is All You Need", "Attention Is All You Need"),
+        ("Can you load the paper 'BERT: Pre-training of deep bidirectional transformers'",
+         "BERT: Pre-training of deep bidirectional transformers"),
+        ("find papers on graph neural networks", "graph neural networks"),
+    ])
+    def test_paper_lookup(self, message, title):
+        d = query_router.route_general_message(message)
+        assert d.tool == "research_lookup"
+        assert d.payload == {"paper_title": title}
+
+    @pytest.mark.parametrize("message", [
+        "what's the latest news on SpaceX?",
+        "what is the current price of bitcoin",
+        "who won the game yesterday",
+        "search the web for python 3.13 release notes",
+    ])
+    def test_web_search(self, message):
+        d = query_router.route_general_message(message)
+        assert d.tool == "web_search" and d.payload["query"]
+
+    @pytest.mark.parametrize("message", [
+        "explain transformers",
+        "what is current in an electrical circuit",
+        "find the paper",
+        "get the paper's main contribution",
+        "get the paper's results section",
+        "what is the latest checkpoint used in the experiments",
+        "which method is currently state of the art according to the paper",
+        "how does the model forecast weather",
+        "summarize the news classification results",
+        "what does the breaking point analysis show",
+        "what are the recent developments discussed in the related work",
+        "how do today's language models compare to the ones in the paper",
+    ])
+    def test_residual_goes_to_model(self, message):
+        assert query_router.route_general_message(message) is None
+
+    def test_response_shape_and_stats(self):
+        resp = query_router.route_general_message("search the web for rust 2024 edition").as_response()
+        assert resp["__tool_name"] == "web_search"
+        assert resp["__tool_payload"] == {"query": "rust 2024 edition"}
+        query_router.route_general_message("explain transformers")
+        stats = query_router.intent_stats()
+        assert stats["web_search"] == 1 and stats["model"] == 1
+        assert stats["local_ratio"] == 0.5
@@ -0,0 +1,121 @@
+# tests/test_streaming.py
+# Tests for streamed LLM responses (SSE parsing and tool-use reassembly)
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+llm_bridge = pytest.importorskip("llm_bridge")
+claude_mcp_client = pytest.importorskip("claude_mcp_client")
+
+
+def sse(*events):
+    lines = []
+    for name, data in events:
+        lines.append(f"event: {name}")
+        lines.append(f"data: {json.dumps(data)}")
+        lines.append("")
+    return lines
+
+
+class FakeSession:
+    def __init__(self, post):
+        self.post = post
+
+
+class FakeStreamResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+TEXT_EVENTS = sse(
+    ("message_start", {"type": "message_start", "message": {"id": "m1", "role": "assistant", "content": []}}),
+    ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}),
+    ("ping", {"type": "ping"}),
+    ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Hello"}}),
+    ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": " world"}}),
+    ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+    ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"}}),
+    ("message_stop", {"type": "message_stop"}),
+)
+
+TOOL_EVENTS = sse(
+    ("message_start", {"type": "message_start", "message": {"id": "m2", "role": "assistant", "content": []}}),
+    ("content_block_start", {"type": "content_block_start", "index": 0,
+                             "content_block": {"type": "tool_use", "id": "t1", "name": "web_search", "input": {}}}),
+    ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                             "delta": {"type": "input_json_delta", "partial_json": "{\"query\": \"lat"}}),
+    ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                             "delta": {"type": "input_json_delta", "partial_json": "est news\"}"}}),
+    ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+    ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "tool_use"}}),
+)
+
+
+class TestSSE:
+    def test_iter_sse_events_skips_comments_and_bad_json(self):
+        lines = [": keepalive", "event: a", "data: {\"x\": 1}", "", "data: not-json", "", "event: b", "data: {\"y\": 2}"]
+        events = list(llm_bridge.iter_sse_events(FakeStreamResponse(lines)))
+        assert events == [("a", {"x": 1}), ("b", {"y": 2})]
+
+    def test_stream_with_claude_yields_text_deltas(self, monkeypatch):
+        monkeypatch.setattr(llm_bridge, "get_session", lambda: FakeSession(lambda *a, **k: FakeStreamResponse(TEXT_EVENTS)))
+        chunks = list(llm_bridge.stream_with_claude("ctx", "q"))
+        assert chunks == ["Hello", " world"]
+
+    def test_stream_with_claude_reports_errors_as_text(self, monkeypatch):
+        def boom(*a, **k):
+            raise ConnectionError("down")
+        monkeypatch.setattr(llm_bridge, "get_session", lambda: FakeSession(boom))
+        chunks = list(llm_bridge.stream_with_claude("ctx", "q"))
+        assert len(chunks) == 1 and chunks[0].startswith("[Claude error]")
+
+
+class TestClaudeStream:
+    def make_client(self):
+        return claude_mcp_client.ClaudeMCPClient(api_key="test")
+
+    def test_text_response(self, monkeypatch):
+        monkeypatch.setattr(claude_mcp_client, "get_session", lambda: FakeSession(lambda *a, **k: FakeStreamResponse(TEXT_EVENTS)))
+        stream = self.make_client().stream_message("hi")
+        assert "".join(stream) == "Hello world"
+        assert stream.result["content"] == [{"type": "text", "text": "Hello world"}]
+        assert stream.result["stop_reason"] == "end_turn"
+        assert "__tool_name" not in stream.result
+
+    def test_tool_use_is_reassembled(self, monkeypatch):
+        monkeypatch.setattr(claude_mcp_client, "get_session", lambda: FakeSession(lambda *a, **k: FakeStreamResponse(TOOL_EVENTS)))
+        stream = self.make_client().stream_message("what's new?")
+        assert list(stream) == []
+        assert stream.result["__tool_name"] == "web_search"
+        assert stream.result["__tool_payload"] == {"query": "latest news"}
+
+    def test_stream_uses_main_model_with_auto_tools(self, monkeypatch):
+        sent = {}
+
+        def post(url, json=None, **kwargs):
+            sent.update(json)
+            return FakeStreamResponse(TEXT_EVENTS)
+
+        monkeypatch.setattr(claude_mcp_client, "get_session", lambda: FakeSession(post))
+        stream = self.make_client().stream_message("explain transformers")
+        assert "".join(stream) == "Hello world"
+        assert sent["model"] == claude_mcp_client.DEFAULT_MODEL
+        assert sent["tool_choice"] == {"type": "auto"}
+        assert {t["name"] for t in sent["tools"]} == {"research_lookup", "web_search"}
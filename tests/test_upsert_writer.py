@@ -0,0 +1,73 @@
+# tests/test_upsert_writer.py
+# Tests for batched vector upserts
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upsert_writer import BatchedUpserter, vector_payload_bytes
+
+
+class FakeIndex:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def upsert(self, vectors, namespace):
+        with self.lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ConnectionError("transient")
+            self.calls.append((namespace, list(vectors)))
+
+
+def _vectors(n, text="x"):
+    return [{"id": f"1-{i}", "values": [0.1, 0.2], "metadata": {"text": text}} for i in range(n)]
+
+
+class TestBatchedUpserter:
+    """Test BatchedUpserter batching and retries"""
+
+    def test_splits_by_vector_count(self):
+        """Test that batches never exceed max_vectors"""
+        index = FakeIndex()
+        writer = BatchedUpserter(index, "ns", max_vectors=4, max_bytes=10**6, workers=2)
+        writer.add(_vectors(10))
+        stats = writer.close()
+        assert stats["vectors"] == 10
+        assert sorted(len(v) for _, v in index.calls) == [2, 4, 4]
+
+    def test_splits_by_payload_bytes(self):
+        """Test that batches stay under the byte limit"""
+        vectors = _vectors(6, text="y" * 200)
+        limit = vector_payload_bytes(vectors[0]) * 2
+        index = FakeIndex()
+        writer = BatchedUpserter(index, "ns", max_vectors=100, max_bytes=limit, workers=2)
+        writer.add(vectors)
+        stats = writer.close()
+        assert stats["batches"] == 3
+        assert all(b["bytes"] <= limit for b in stats["batch_stats"])
+
+    def test_retries_failed_batches(self):
+        """Test that transient failures are retried"""
+        index = FakeIndex(fail_times=2)
+        writer = BatchedUpserter(index, "ns", max_vectors=5, workers=1, retries=3, backoff=0)
+        writer.add(_vectors(5))
+        stats = writer.close()
+        assert stats["vectors"] == 5
+        assert stats["retries"] == 2
+
+    def test_raises_after_retries_exhausted(self):
+        """Test that a batch failing every attempt surfaces the error"""
+        index = FakeIndex(fail_times=10)
+        writer = BatchedUpserter(index, "ns", max_vectors=5, workers=1, retries=1, backoff=0)
+        writer.add(_vectors(3))
+        with pytest.raises(ConnectionError):
+            writer.close()
+
+# Run tests with: pytest tests/ -v
@@ -0,0 +1,152 @@
+# tests/test_vector_backends.py
+# Tests for the local vector index backend
+# Run with: pytest tests/ -v
+
+import pytest
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _vec(vid, paper_id, dense, indices, values, text="chunk"):
+    return {
+        "id": vid,
+        "values": dense,
+        "sparse_values": {"indices": indices, "values": values},
+        "metadata": {"paper_id": float(paper_id), "text": text, "page": 1, "type": "text"},
+    }
+
+
+class TestLocalBackend:
+    """Test LocalBackend hybrid queries"""
+
+    def test_hybrid_query_respects_paper_filter(self, tmp_path):
+        """Test that only the filtered paper's vectors are returned"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        backend = LocalBackend(str(tmp_path), dimension=3)
+        backend.upsert([
+            _vec("1-a", 1, [1.0, 0.0, 0.0], [7], [1.0], "first"),
+            _vec("1-b", 1, [0.0, 1.0, 0.0], [8], [1.0], "second"),
+            _vec("2-a", 2, [1.0, 0.0, 0.0], [7], [5.0], "other paper"),
+        ], namespace="user_test")
+        res = backend.query(
+            vector=[0.0, 1.0, 0.0],
+            sparse_vector={"indices": [7], "values": [0.5]},
+            top_k=5,
+            namespace="user_test",
+            filter={"paper_id": {"$eq": 1.0}},
+        )
+        ids = [m["id"] for m in res["matches"]]
+        assert ids == ["1-b", "1-a"]
+        assert res["matches"][0]["metadata"]["text"] == "second"
+
+    def test_persists_and_overwrites_ids(self, tmp_path):
+        """Test that upserts survive a reload and replace existing ids"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        backend = LocalBackend(str(tmp_path), dimension=2)
+        backend.upsert([_vec("1-a", 1, [1.0, 0.0], [], [], "old")], namespace="ns")
+        backend.upsert([_vec("1-a", 1, [0.0, 1.0], [], [], "new")], namespace="ns")
+        backend.flush()
+        reloaded = LocalBackend(str(tmp_path), dimension=2)
+        res = reloaded.query(vector=[0.0, 1.0], top_k=1, namespace="ns")
+        assert res["matches"][0]["metadata"]["text"] == "new"
+        assert res["matches"][0]["score"] == pytest.approx(1.0)
+        assert reloaded.describe_index_stats()["total_vector_count"] == 1
+
+    def test_delete_paper_removes_partition(self, tmp_path):
+        """Test that deleting a paper leaves the namespace's other papers alone"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        backend = LocalBackend(str(tmp_path), dimension=2)
+        backend.upsert([
+            _vec("1-a", 1, [1.0, 0.0], [], []),
+            _vec("2-a", 2, [1.0, 0.0], [], []),
+        ], namespace="ns")
+        assert backend.delete_paper("ns", 1) == 1
+        res = backend.query(vector=[1.0, 0.0], top_k=5, namespace="ns")
+        assert [m["id"] for m in res["matches"]] == ["2-a"]
+
+    def test_reader_sees_other_writers_flush(self, tmp_path):
+        """Test that a cached partition is reloaded after another instance flushes it"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        writer = LocalBackend(str(tmp_path), dimension=2)
+        reader = LocalBackend(str(tmp_path), dimension=2)
+        writer.upsert([_vec("1-a", 1, [1.0, 0.0], [], [])], namespace="ns")
+        writer.flush()
+        flt = {"paper_id": {"$eq": 1.0}}
+        assert len(reader.query(vector=[1.0, 0.0], top_k=5, namespace="ns", filter=flt)["matches"]) == 1
+        writer.upsert([_vec("1-b", 1, [1.0, 0.0], [], []), _vec("1-c", 1, [0.0, 1.0], [], [])], namespace="ns")
+        writer.flush()
+        assert len(reader.query(vector=[1.0, 0.0], top_k=5, namespace="ns", filter=flt)["matches"]) == 3
+        writer.delete_paper("ns", 1)
+        assert reader.query(vector=[1.0, 0.0], top_k=5, namespace="ns", filter=flt)["matches"] == []
+
+    def test_flush_writes_one_generation_behind_manifest(self, tmp_path):
+        """Test that upserts append until flush, which leaves exactly one generation on disk"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        backend = LocalBackend(str(tmp_path), dimension=2)
+        backend.upsert([_vec("1-a", 1, [1.0, 0.0], [3], [1.0], "old")], namespace="ns")
+        backend.upsert([_vec("1-a", 1, [0.0, 1.0], [4], [1.0], "new"), _vec("1-b", 1, [1.0, 0.0], [], [])], namespace="ns")
+        part_dir = tmp_path / "ns" / "paper_1"
+        assert not part_dir.exists()
+        backend.flush()
+        backend.flush()  # nothing dirty, no new generation
+        names = sorted(n for n in os.listdir(part_dir) if n != "manifest.json.lock")
+        assert len(names) == 3 and "manifest.json" in names
+        res = backend.query(vector=[0.0, 0.0], sparse_vector={"indices": [3], "values": [1.0]}, top_k=5, namespace="ns")
+        assert sorted(m["id"] for m in res["matches"]) == ["1-a", "1-b"]
+        assert all(m["metadata"]["text"] != "old" for m in res["matches"])
+
+    def test_interleaved_writers_keep_both_flushes(self, tmp_path):
+        """Test that two instances flushing the same paper merge instead of dropping each other's rows"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        first = LocalBackend(str(tmp_path), dimension=2)
+        second = LocalBackend(str(tmp_path), dimension=2)
+        first.upsert([_vec("1-a", 1, [1.0, 0.0], [], [])], namespace="ns")
+        second.upsert([_vec("1-b", 1, [0.0, 1.0], [], [])], namespace="ns")
+        first.flush()
+        second.flush()
+        part_dir = tmp_path / "ns" / "paper_1"
+        with open(part_dir / "manifest.json") as f:
+            manifest = json.load(f)
+        names = set(os.listdir(part_dir)) - {"manifest.json", "manifest.json.lock"}
+        assert names == {manifest["dense"], manifest["rows"]}
+        reader = LocalBackend(str(tmp_path), dimension=2)
+        res = reader.query(vector=[1.0, 1.0], top_k=5, namespace="ns")
+        assert sorted(m["id"] for m in res["matches"]) == ["1-a", "1-b"]
+        assert manifest["count"] == 2
+
+    def test_stats_read_manifests_without_loading(self, tmp_path):
+        """Test that describe_index_stats counts vectors from manifests only"""
+        try:
+            from vector_backends import LocalBackend
+        except ImportError as e:
+            pytest.skip(f"Dependencies not installed: {e}")
+        writer = LocalBackend(str(tmp_path), dimension=2)
+        writer.upsert([_vec("1-a", 1, [1.0, 0.0], [], []), _vec("2-a", 2, [1.0, 0.0], [], [])], namespace="ns")
+        writer.flush()
+        reader = LocalBackend(str(tmp_path), dimension=2)
+        stats = reader.describe_index_stats()
+        assert stats["namespaces"] == {"ns": {"vector_count": 2}}
+        assert reader._partitions == {}
+
+# Run tests with: pytest tests/ -v
@@ -0,0 +1,58 @@
+# tests/test_vector_codec.py
+# Tests for the stored-vector encodings used by paper_chunks
+# Run with: pytest tests/ -v
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+from vector_codec import encode_dense, decode_dense, encode_sparse, decode_sparse
+
+
+class TestDense:
+    """Test float16 base64 encoding of dense vectors"""
+
+    def test_round_trip_is_close(self):
+        rng = np.random.default_rng(0)
+        vec = rng.standard_normal(768).astype(np.float32)
+        vec /= np.linalg.norm(vec)
+        out = decode_dense(encode_dense(vec), 768)
+        assert out.dtype == np.float32
+        assert np.allclose(out, vec, atol=1e-3)
+        assert abs(float(out @ vec) - 1.0) < 1e-3
+
+    def test_encoding_is_compact_ascii(self):
+        data = encode_dense([0.1] * 768)
+        assert data.isascii()
+        assert len(data) == 2048  # 768 * 2 bytes, base64
+
+    def test_accepts_lists(self):
+        assert decode_dense(encode_dense([1.0, -2.0, 0.5])).tolist() == [1.0, -2.0, 0.5]
+
+    def test_dimension_mismatch_raises(self):
+        with pytest.raises(ValueError):
+            decode_dense(encode_dense([1.0, 2.0]), 768)
+
+    def test_rejects_matrix(self):
+        with pytest.raises(ValueError):
+            encode_dense(np.zeros((2, 3)))
+
+
+class TestSparse:
+    """Test JSON encoding of BM25 sparse vectors"""
+
+    def test_round_trip_converts_numpy_types(self):
+        stored = encode_sparse({"indices": np.array([3, 17], dtype=np.int64), "values": np.array([0.5, 1.25])})
+        assert stored == {"indices": [3, 17], "values": [0.5, 1.25]}
+        assert decode_sparse(stored) == stored
+
+    def test_missing_is_none(self):
+        assert decode_sparse(None) is None
+        assert decode_sparse({}) is None
+
+    def test_mismatched_lengths_raise(self):
+        with pytest.raises(ValueError):
+            decode_sparse({"indices": [1, 2], "values": [0.5]})
@@ -0,0 +1,122 @@
+#size-aware batched upserts: splits by vector count and payload bytes, sends batches on a bounded pool, retries with backoff
+from __future__ import annotations
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional
+logger = logging.getLogger(__name__)
+UPSERT_MAX_VECTORS = int(os.getenv("UPSERT_MAX_VECTORS", "100"))
+UPSERT_MAX_BYTES = int(os.getenv("UPSERT_MAX_BYTES", str(1_500_000))) #pinecone rejects requests above 2MB
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", "3"))
+def vector_payload_bytes(vector: Dict[str, Any]) -> int:
+    return len(json.dumps(vector, separators=(",", ":")))
+class BatchedUpserter:
+    def __init__(
+        self,
+        index,
+        namespace: str,
+        max_vectors: int = UPSERT_MAX_VECTORS,
+        max_bytes: int = UPSERT_MAX_BYTES,
+        workers: int = UPSERT_WORKERS,
+        retries: int = UPSERT_RETRIES,
+        backoff: float = 1.0,
+        on_batch_done: Optional[Callable[[int], None]] = None,
+    ):
+        self.index = index
+        self.namespace = namespace
+        self.max_vectors = max_vectors
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.backoff = backoff
+        self.on_batch_done = on_batch_done
+        self.batch_stats: List[Dict[str, Any]] = []
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upsert")
+        self._inflight = threading.BoundedSemaphore(workers * 2) #backpressure: callers block instead of queueing unbounded batches
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_bytes = 0
+        self._batch_no = 0
+        self._started = time.perf_counter()
+    def add(self, vectors: List[Dict[str, Any]]) -> None:
+        for v in vectors:
+            size = vector_payload_bytes(v)
+            if size > self.max_bytes:
+                logger.warning(f"Vector {v.get('id')} is {size} bytes, above the {self.max_bytes} byte batch limit; sending alone.")
+            if self._pending and (
+                len(self._pending) >= self.max_vectors or self._pending_bytes + size > self.max_bytes
+            ):
+                self.flush()
+            self._pending.append(v)
+            self._pending_bytes += size
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, size = self._pending, self._pending_bytes
+        self._pending, self._pending_bytes = [], 0
+        self._batch_no += 1
+        self._inflight.acquire()
+        future = self._pool.submit(self._send, self._batch_no, batch, size)
+        future.add_done_callback(lambda f: self._inflight.release())
+        self._futures.append(future)
+    def _send(self, batch_no: int, batch: List[Dict[str, Any]], size: int) -> int:
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            attempt += 1
+            try:
+                self.index.upsert(vectors=batch, namespace=self.namespace)
+                break
+            except Exception as e:
+                if attempt > self.retries:
+                    logger.error(f"Upsert batch {batch_no} failed after {attempt} attempts: {e}")
+                    raise
+                wait = self.backoff * (2 ** (attempt - 1))
+                logger.warning(f"Retrying upsert batch {batch_no} ({attempt}/{self.retries}) in {wait:.1f}s: {e}")
+                time.sleep(wait)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.batch_stats.append({
+                "batch": batch_no,
+                "vectors": len(batch),
+                "bytes": size,
+                "attempts": attempt,
+                "seconds": round(elapsed, 4),
+            })
+        logger.debug(f"Upsert batch {batch_no}: {len(batch)} vectors, {size} bytes, {elapsed:.2f}s, {attempt} attempt(s).")
+        if self.on_batch_done:
+            self.on_batch_done(len(batch))
+        return len(batch)
+    def close(self) -> Dict[str, Any]:
+        try:
+            self.flush()
+            sent = sum(f.result() for f in self._futures) #re-raises the first failed batch
+            flush = getattr(self.index, "flush", None) #local backend persists once here instead of per batch
+            if flush is not None:
+                flush()
+        finally:
+            self._pool.shutdown(wait=True)
+        elapsed = time.perf_counter() - self._started
+        summary = {
+            "vectors": sent,
+            "batches": len(self.batch_stats),
+            "bytes": sum(b["bytes"] for b in self.batch_stats),
+            "retries": sum(b["attempts"] - 1 for b in self.batch_stats),
+            "seconds": round(elapsed, 4),
+            "vectors_per_second": round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "batch_stats": sorted(self.batch_stats, key=lambda b: b["batch"]),
+        }
+        logger.info(
+            f"Upserted {sent} vectors in {summary['batches']} batches "
+            f"({summary['vectors_per_second']} vectors/s, {summary['retries']} retries)."
+        )
+        return summary
+    def abort(self) -> None:
+        self._pending, self._pending_bytes = [], 0
+        for f in self._futures:
+            f.cancel()
+        self._pool.shutdown(wait=True)
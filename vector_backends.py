@@ -0,0 +1,372 @@
+#vector store backends: pinecone (remote) or a local numpy index for offline runs, tests and benchmarks
+from __future__ import annotations
+import os
+import json
+import uuid
+import shutil
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+try:
+    import fcntl #POSIX only
+except ImportError:
+    fcntl = None
+logger = logging.getLogger(__name__)
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "manifest.json.lock"
+LEGACY_FILES = ("ids.json", "meta.jsonl", "sparse.jsonl", "dense.npy")
+class VectorBackend:
+    #same call shapes as a pinecone Index so the ingest/query code does not care which one it talks to
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = ""):
+        raise NotImplementedError
+    def query(
+        self,
+        vector: List[float],
+        sparse_vector: Optional[Dict[str, List]] = None,
+        top_k: int = 5,
+        include_metadata: bool = True,
+        namespace: str = "",
+        filter: Optional[Dict[str, Any]] = None,
+    ):
+        raise NotImplementedError
+    def describe_index_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+    def delete_paper(self, namespace: str, paper_id: int) -> int:
+        raise NotImplementedError
+    def flush(self) -> None:
+        #called once a paper's upserts are done; backends that write through can ignore it
+        return None
+class PineconeBackend(VectorBackend):
+    def __init__(self, index):
+        self.index = index
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = ""):
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+    def query(self, vector, sparse_vector=None, top_k=5, include_metadata=True, namespace="", filter=None):
+        kwargs = {}
+        if sparse_vector is not None:
+            kwargs["sparse_vector"] = sparse_vector
+        if filter is not None:
+            kwargs["filter"] = filter
+        return self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            namespace=namespace,
+            **kwargs,
+        )
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+    def delete_paper(self, namespace: str, paper_id: int) -> int:
+        #vector ids are "<paper_id>-<uuid>", serverless indexes can't delete by metadata filter so list by prefix
+        deleted = 0
+        for ids in self.index.list(prefix=f"{int(paper_id)}-", namespace=namespace):
+            if ids:
+                self.index.delete(ids=list(ids), namespace=namespace)
+                deleted += len(ids)
+        return deleted
+def _partition_key(paper_id: Any) -> str:
+    if paper_id is None:
+        return "_default"
+    try:
+        return f"paper_{int(float(paper_id))}"
+    except (TypeError, ValueError):
+        return f"paper_{paper_id}"
+def _matches_filter(meta: Dict[str, Any], flt: Dict[str, Any]) -> bool:
+    for key, cond in flt.items():
+        value = meta.get(key)
+        if isinstance(cond, dict):
+            if "$eq" in cond and value != cond["$eq"]:
+                return False
+            if "$ne" in cond and value == cond["$ne"]:
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+def _manifest_stamp(path: str) -> Optional[Tuple[int, int]]:
+    #the manifest is replaced atomically on every flush, so a new inode/mtime means another writer flushed
+    try:
+        st = os.stat(os.path.join(path, MANIFEST_NAME))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+def _read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+def _write_atomic(path: str, write: Callable[[Any], None], binary: bool = False) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb" if binary else "w") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+@contextmanager
+def _flush_lock(path: str) -> Iterator[None]:
+    #serialises read-merge-write-cleanup between processes flushing the same partition; readers never take it
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, LOCK_NAME), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+class _Partition:
+    #one paper's vectors: dense matrix (memory-mapped from disk) + sparse postings + metadata rows.
+    #on disk: dense.<gen>.npy and rows.<gen>.jsonl (id, metadata, sparse per line) named by manifest.json, which is
+    #replaced last so readers always see one complete generation. Upserts only append in memory (an overwritten id
+    #leaves a dead row behind); flush() compacts and writes the generation once, normally once per paper
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.stamp: Optional[Tuple[int, int]] = None
+        self.dirty = False
+        self._reset()
+        self.load()
+    def _reset(self):
+        self.ids: List[str] = []
+        self.metas: List[Dict[str, Any]] = []
+        self.sparse_rows: List[Dict[str, List]] = []
+        self.alive: List[bool] = []
+        self.positions: Dict[str, int] = {}
+        self.postings: Dict[int, List[List[float]]] = {}
+        self._blocks: List[np.ndarray] = []
+        self._dense: Optional[np.ndarray] = None
+        self._base = 0
+    @property
+    def count(self) -> int:
+        return len(self.positions)
+    @property
+    def dense(self) -> np.ndarray:
+        if self._dense is None:
+            if not self._blocks:
+                self._dense = np.zeros((0, self.dimension), dtype=np.float32)
+            elif len(self._blocks) == 1:
+                self._dense = self._blocks[0]
+            else:
+                self._dense = np.vstack(self._blocks)
+            self._blocks = [self._dense]
+        return self._dense
+    def load(self):
+        for _ in range(3):
+            stamp = _manifest_stamp(self.path)
+            self._reset()
+            try:
+                if stamp is not None:
+                    self._load_generation(_read_manifest(self.path) or {})
+                elif os.path.exists(os.path.join(self.path, "ids.json")):
+                    self._load_legacy()
+            except FileNotFoundError: #a writer replaced the generation between reading the manifest and its files
+                continue
+            self.stamp = stamp
+            self.dirty = False
+            self._base = len(self.ids) #rows past this index were upserted here and are not on disk yet
+            return
+        raise RuntimeError(f"Local index partition {self.path} kept changing while loading.")
+    def _load_generation(self, manifest: Dict[str, Any]):
+        with open(os.path.join(self.path, manifest["rows"])) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        dense = np.load(os.path.join(self.path, manifest["dense"]), mmap_mode="r")
+        for r in rows:
+            self._append_row(r["id"], r.get("metadata") or {}, r.get("sparse_values") or {"indices": [], "values": []})
+        if dense.shape[0]:
+            self._blocks.append(dense)
+    def _load_legacy(self):
+        #partitions written before manifest.json: ids.json, meta.jsonl, sparse.jsonl, dense.npy; rewritten on next flush
+        with open(os.path.join(self.path, "ids.json")) as f:
+            ids = json.load(f)
+        with open(os.path.join(self.path, "meta.jsonl")) as f:
+            metas = [json.loads(line) for line in f if line.strip()]
+        with open(os.path.join(self.path, "sparse.jsonl")) as f:
+            sparse_rows = [json.loads(line) for line in f if line.strip()]
+        dense = np.load(os.path.join(self.path, "dense.npy"), mmap_mode="r")
+        n = min(len(ids), len(metas), len(sparse_rows), dense.shape[0]) #legacy saves were not atomic
+        for i in range(n):
+            self._append_row(ids[i], metas[i], sparse_rows[i])
+        if n:
+            self._blocks.append(dense[:n])
+    def _append_row(self, vid: str, meta: Dict[str, Any], sparse: Dict[str, List]):
+        if vid in self.positions:
+            self.alive[self.positions[vid]] = False
+        row = len(self.ids)
+        self.positions[vid] = row
+        self.ids.append(vid)
+        self.metas.append(meta)
+        self.sparse_rows.append(sparse)
+        self.alive.append(True)
+        for idx, val in zip(sparse.get("indices", []), sparse.get("values", [])):
+            self.postings.setdefault(int(idx), []).append([row, float(val)])
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        block = np.zeros((len(vectors), self.dimension), dtype=np.float32)
+        for i, v in enumerate(vectors):
+            values = np.asarray(v.get("values") or [0.0] * self.dimension, dtype=np.float32)
+            if values.shape[0] != self.dimension:
+                raise ValueError(
+                    f"Vector dimension {values.shape[0]} does not match index dimension {self.dimension}."
+                )
+            block[i] = values
+        for v in vectors:
+            sparse = v.get("sparse_values") or {"indices": [], "values": []}
+            sparse = {"indices": [int(i) for i in sparse["indices"]], "values": [float(x) for x in sparse["values"]]}
+            self._append_row(v["id"], v.get("metadata") or {}, sparse)
+        if vectors:
+            self._blocks.append(block)
+            self._dense = None
+            self.dirty = True
+    def _copy_rows(self, other: "_Partition", rows: List[int]):
+        for i in rows:
+            self._append_row(other.ids[i], other.metas[i], other.sparse_rows[i])
+        if rows:
+            self._blocks.append(np.asarray(other.dense[rows], dtype=np.float32))
+            self._dense = None
+            self.dirty = True
+    def flush(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with _flush_lock(self.path):
+            source: _Partition = self
+            if _manifest_stamp(self.path) != self.stamp:
+                #another process flushed (or deleted) since this copy was loaded: start from what is on disk now
+                #and re-apply only the rows upserted here, so neither writer's upserts are lost
+                source = _Partition(self.path, self.dimension)
+                source._copy_rows(self, [i for i in range(self._base, len(self.ids)) if self.alive[i]])
+            replaced = _read_manifest(self.path)
+            source._write_generation()
+            #only the generation this flush replaced is removed, never files another writer may still need
+            stale = [replaced["dense"], replaced["rows"]] if replaced else list(LEGACY_FILES)
+            for name in stale:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+        self.load() #compacted rows, dense memory-mapped again
+    def _write_generation(self):
+        live = [i for i, a in enumerate(self.alive) if a]
+        gen = uuid.uuid4().hex[:12] #unique per flush, two writers never share file names
+        dense_name, rows_name = f"dense.{gen}.npy", f"rows.{gen}.jsonl"
+        dense = np.asarray(self.dense[live] if len(live) < len(self.ids) else self.dense, dtype=np.float32)
+        _write_atomic(os.path.join(self.path, dense_name), lambda f: np.save(f, dense), binary=True)
+        def write_rows(f):
+            for i in live:
+                f.write(json.dumps({"id": self.ids[i], "metadata": self.metas[i], "sparse_values": self.sparse_rows[i]}) + "\n")
+        _write_atomic(os.path.join(self.path, rows_name), write_rows)
+        manifest = {"dense": dense_name, "rows": rows_name, "count": len(live), "dimension": self.dimension}
+        _write_atomic(os.path.join(self.path, MANIFEST_NAME), lambda f: json.dump(manifest, f))
+    def scores(self, dense_q: np.ndarray, sparse_q: Optional[Dict[str, List]]) -> np.ndarray:
+        if not self.ids:
+            return np.zeros(0, dtype=np.float32)
+        scores = np.asarray(self.dense @ dense_q, dtype=np.float32)
+        if sparse_q:
+            for idx, val in zip(sparse_q.get("indices", []), sparse_q.get("values", [])):
+                for row, w in self.postings.get(int(idx), []):
+                    scores[int(row)] += val * w
+        return scores
+class LocalBackend(VectorBackend):
+    #hybrid dotproduct over per-namespace/per-paper partitions stored under root_dir/<namespace>/paper_<id>/
+    def __init__(self, root_dir: str, dimension: int):
+        self.root_dir = root_dir
+        self.dimension = dimension
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root_dir, exist_ok=True)
+    def _partition(self, namespace: str, key: str) -> _Partition:
+        cache_key = f"{namespace}/{key}"
+        part = self._partitions.get(cache_key)
+        if part is None:
+            part = _Partition(os.path.join(self.root_dir, namespace, key), self.dimension)
+            self._partitions[cache_key] = part
+        elif not part.dirty and part.stamp != _manifest_stamp(part.path): #another process flushed or deleted it
+            part.load()
+        return part
+    def _partition_keys(self, namespace: str) -> List[str]:
+        ns_dir = os.path.join(self.root_dir, namespace)
+        keys = set(k.split("/", 1)[1] for k in self._partitions if k.split("/", 1)[0] == namespace)
+        if os.path.isdir(ns_dir):
+            keys.update(os.listdir(ns_dir))
+        return sorted(keys)
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = ""):
+        namespace = namespace or "_default"
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for v in vectors:
+            key = _partition_key((v.get("metadata") or {}).get("paper_id"))
+            grouped.setdefault(key, []).append(v)
+        with self._lock:
+            for key, group in grouped.items():
+                self._partition(namespace, key).upsert(group)
+        return {"upserted_count": len(vectors)}
+    def query(self, vector, sparse_vector=None, top_k=5, include_metadata=True, namespace="", filter=None):
+        namespace = namespace or "_default"
+        filter = dict(filter or {})
+        dense_q = np.asarray(vector, dtype=np.float32)
+        candidates = []
+        with self._lock:
+            paper_cond = filter.get("paper_id")
+            if isinstance(paper_cond, dict) and set(paper_cond) == {"$eq"}:
+                keys = [_partition_key(filter.pop("paper_id")["$eq"])] #paper_id filter = read a single partition
+            else:
+                keys = self._partition_keys(namespace)
+            for key in keys:
+                part = self._partition(namespace, key)
+                scores = part.scores(dense_q, sparse_vector)
+                taken = 0
+                for row in np.argsort(-scores, kind="stable"):
+                    if taken >= top_k:
+                        break
+                    if not part.alive[row] or (filter and not _matches_filter(part.metas[row], filter)):
+                        continue
+                    candidates.append((float(scores[row]), part.ids[row], part.metas[row]))
+                    taken += 1
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        matches = []
+        for score, vid, meta in candidates[:top_k]:
+            m = {"id": vid, "score": score}
+            if include_metadata:
+                m["metadata"] = meta
+            matches.append(m)
+        return {"matches": matches, "namespace": namespace}
+    def flush(self) -> None:
+        with self._lock:
+            for part in self._partitions.values():
+                part.flush()
+    def _stored_count(self, namespace: str, key: str) -> int:
+        part = self._partitions.get(f"{namespace}/{key}")
+        if part is not None and part.dirty:
+            return part.count
+        path = os.path.join(self.root_dir, namespace, key)
+        manifest = _read_manifest(path)
+        if manifest is not None:
+            return int(manifest.get("count", 0))
+        if part is None and os.path.exists(os.path.join(path, "ids.json")): #legacy partition, not flushed since
+            part = self._partition(namespace, key)
+        return part.count if part is not None else 0
+    def describe_index_stats(self):
+        #counts come from the manifests (or unflushed partitions), no partition is loaded
+        namespaces: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            names = set(os.listdir(self.root_dir)) if os.path.isdir(self.root_dir) else set()
+            names.update(k.split("/", 1)[0] for k in self._partitions)
+            for ns in sorted(names):
+                count = sum(self._stored_count(ns, key) for key in self._partition_keys(ns))
+                if count or os.path.isdir(os.path.join(self.root_dir, ns)):
+                    namespaces[ns] = {"vector_count": count}
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+    def delete_paper(self, namespace: str, paper_id: int) -> int:
+        namespace = namespace or "_default"
+        key = _partition_key(paper_id)
+        with self._lock:
+            deleted = self._stored_count(namespace, key)
+            self._partitions.pop(f"{namespace}/{key}", None)
+            shutil.rmtree(os.path.join(self.root_dir, namespace, key), ignore_errors=True)
+        return deleted
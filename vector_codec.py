@@ -0,0 +1,30 @@
+#compact text encodings for vectors stored next to paper_chunks rows, so an index can be rebuilt without the model
+#dense: little-endian float16 bytes, base64 (768 dims -> 1536 bytes -> 2048 chars instead of ~15KB of JSON floats)
+#sparse: {"indices": [...], "values": [...]} as-is, BM25 vectors are short and JSONB keeps them inspectable
+from __future__ import annotations
+import base64
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+_DENSE_DTYPE = np.dtype("<f2")
+def encode_dense(vec: Sequence[float]) -> str:
+    arr = np.asarray(vec, dtype=np.float32)
+    if arr.ndim != 1:
+        raise ValueError(f"Expected a 1-d vector, got shape {arr.shape}.")
+    return base64.b64encode(arr.astype(_DENSE_DTYPE).tobytes()).decode("ascii")
+def decode_dense(data: str, dimension: Optional[int] = None) -> np.ndarray:
+    arr = np.frombuffer(base64.b64decode(data), dtype=_DENSE_DTYPE).astype(np.float32)
+    if dimension is not None and arr.shape[0] != dimension:
+        raise ValueError(f"Stored vector has {arr.shape[0]} dims, expected {dimension}.")
+    return arr
+def encode_sparse(sparse: Dict[str, Any]) -> Dict[str, List]:
+    return {
+        "indices": [int(i) for i in sparse.get("indices", [])],
+        "values": [float(v) for v in sparse.get("values", [])],
+    }
+def decode_sparse(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, List]]:
+    if not data:
+        return None
+    indices, values = data.get("indices") or [], data.get("values") or []
+    if len(indices) != len(values):
+        raise ValueError("Stored sparse vector has mismatched indices/values.")
+    return {"indices": [int(i) for i in indices], "values": [float(v) for v in values]}